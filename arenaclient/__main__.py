@@ -1,27 +1,37 @@
 import argparse
 import asyncio
 import logging
+import logging.handlers
 import os
-from .client import Client
+from .pool import ClientPool
 
 
-async def run_client():
-    ac = Client(cfg)
-    await ac.run()
+async def run_client(pool: ClientPool):
+    await pool.run()
 
 if __name__ == "__main__":  # execute only if run as a script
     parser = argparse.ArgumentParser()
     parser.add_argument("--test", help='Run tests', required=False, action="store_true")
+    parser.add_argument("--export-results", help='Export the results file to the {"Results": [...]} JSON format',
+                        required=False, metavar="EXPORT_FILE")
     args, unknown = parser.parse_known_args()
 
-    if args.test:
+    if args.export_results:
+        from .configs import default_config as cfg
+        from .match.matches import FileMatchSource
+
+        FileMatchSource.export_results(cfg.MATCH_SOURCE_CONFIG.RESULTS_FILE, args.export_results)
+
+    elif args.test:
         # the default config will also import custom config values
         from .configs import default_test_config as cfg
 
         logging.getLogger().setLevel(cfg.LOGGING_LEVEL)  # Logging needs to be initialized before importing rust_ac
-        logging.basicConfig(filename="proxy.log",
+        open(cfg.PROXY_LOG_FILE, "w").close()  # RotatingFileHandler always appends
+        logging.basicConfig(handlers=[logging.handlers.RotatingFileHandler(cfg.PROXY_LOG_FILE,
+                                                                           maxBytes=cfg.PROXY_LOG_MAX_SIZE,
+                                                                           backupCount=1)],
                             level=cfg.LOGGING_LEVEL,
-                            filemode="w+",
                             format='%(asctime)s %(levelname)-8s %(name)s: %(message)s',
                             datefmt='%Y-%m-%d %H:%M:%S',
                             force=True)
@@ -47,24 +57,28 @@ if __name__ == "__main__":  # execute only if run as a script
         from .configs import default_config as cfg
 
         logging.getLogger().setLevel(cfg.LOGGING_LEVEL)  # Logging needs to be initialized before importing rust_ac
-        logging.basicConfig(filename="proxy.log",
+        open(cfg.PROXY_LOG_FILE, "w").close()  # RotatingFileHandler always appends
+        logging.basicConfig(handlers=[logging.handlers.RotatingFileHandler(cfg.PROXY_LOG_FILE,
+                                                                           maxBytes=cfg.PROXY_LOG_MAX_SIZE,
+                                                                           backupCount=1)],
                             level=cfg.LOGGING_LEVEL,
-                            filemode="w+",
                             format='%(asctime)s %(levelname)-8s %(name)s: %(message)s',
                             datefmt='%Y-%m-%d %H:%M:%S',
-                            force=True )
+                            force=True)
         logging.info("")
         from rust_ac import Server
 
         os.environ['SC2_PROXY_BASE'] = cfg.SC2_HOME
         os.environ['SC2_PROXY_BIN'] = "SC2_x64"
-        HOST = cfg.SC2_PROXY["HOST"]
-        PORT = cfg.SC2_PROXY["PORT"]
-
-        server = Server(f"{HOST}:{PORT}")
+        pool = ClientPool(cfg)
+        # One proxy per match slot
+        servers = [Server(f"{slot_cfg.SC2_PROXY['HOST']}:{slot_cfg.SC2_PROXY['PORT']}")
+                   for slot_cfg in pool.slot_configs]
         try:
-            server.run()
-            asyncio.get_event_loop().run_until_complete(run_client())
+            for server in servers:
+                server.run()
+            asyncio.get_event_loop().run_until_complete(run_client(pool))
         except Exception as e:
             print(e)
-            server.kill()
+            for server in servers:
+                server.kill()
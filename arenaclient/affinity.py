@@ -0,0 +1,166 @@
+import glob
+import os
+
+import psutil
+
+from .utl import Utl
+
+
+def parse_cpu_list(cpus) -> set:
+    """
+    Parse a CPU list in the cpuset format ("0-3,8") or an iterable of CPU numbers.
+
+    :param cpus:
+    :return: set of CPU numbers, or None if cpus is None
+    """
+    if cpus is None:
+        return None
+    if not isinstance(cpus, str):
+        return set(int(cpu) for cpu in cpus)
+    result = set()
+    for part in cpus.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            result.update(range(int(first), int(last) + 1))
+        else:
+            result.add(int(part))
+    return result
+
+
+def format_cpu_list(cpus: set) -> str:
+    """
+    Format a set of CPU numbers in the cpuset format.
+
+    :param cpus:
+    :return:
+    """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def numa_nodes() -> list:
+    """
+    CPUs of every NUMA node this process may run on. Hosts without NUMA information are treated as one node.
+
+    :return: list of sorted CPU lists
+    """
+    allowed = os.sched_getaffinity(0)
+    nodes = []
+    for cpulist_path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        with open(cpulist_path, "r") as cpulist_file:
+            cpus = parse_cpu_list(cpulist_file.read()) & allowed
+        if cpus:
+            nodes.append(sorted(cpus))
+    return nodes or [sorted(allowed)]
+
+
+def plan_cpu_affinity(slot_count: int) -> list:
+    """
+    Split the CPUs between the match slots for AUTO_CPU_AFFINITY.
+
+    Slots are spread over the NUMA nodes, so a match never spans two nodes. The CPUs a slot gets on its node are
+    split between SC2 and the two bots. Slots that get fewer than three CPUs let the bots share.
+
+    :param slot_count:
+    :return: list of SC2_CPU_AFFINITY, PLAYER1_CPU_AFFINITY and PLAYER2_CPU_AFFINITY config overrides per slot
+    """
+    nodes = numa_nodes()
+    slots_per_node = [len(range(node, slot_count, len(nodes))) for node in range(len(nodes))]
+    next_slot_on_node = [0] * len(nodes)
+    plans = []
+    for slot_id in range(slot_count):
+        node = slot_id % len(nodes)
+        cpus = nodes[node]
+        share = max(len(cpus) // slots_per_node[node], 1)
+        start = (next_slot_on_node[node] * share) % len(cpus)
+        next_slot_on_node[node] += 1
+        slot_cpus = cpus[start:start + share]
+
+        if len(slot_cpus) >= 3:
+            third = len(slot_cpus) // 3
+            sc2, player1, player2 = slot_cpus[:third], slot_cpus[third:2 * third], slot_cpus[2 * third:]
+        elif len(slot_cpus) == 2:
+            sc2, player1, player2 = slot_cpus[:1], slot_cpus[1:], slot_cpus[1:]
+        else:
+            sc2 = player1 = player2 = slot_cpus
+        plans.append({
+            "SC2_CPU_AFFINITY": format_cpu_list(set(sc2)),
+            "PLAYER1_CPU_AFFINITY": format_cpu_list(set(player1)),
+            "PLAYER2_CPU_AFFINITY": format_cpu_list(set(player2)),
+        })
+    return plans
+
+
+class CpuPlacement:
+    """
+    CPUs the SC2 instance and the two bots of a match slot are pinned to (Linux only).
+    Each of them is optional; processes without a CPU list are left alone.
+    """
+
+    def __init__(self, config):
+        self._utl = Utl(config)
+        self.sc2 = parse_cpu_list(config.SC2_CPU_AFFINITY)
+        self.player1 = parse_cpu_list(config.PLAYER1_CPU_AFFINITY)
+        self.player2 = parse_cpu_list(config.PLAYER2_CPU_AFFINITY)
+
+    @staticmethod
+    def from_config(config):
+        """
+        Creates the placement if any of the *_CPU_AFFINITY config values is set.
+
+        :param config:
+        :return: CpuPlacement or None
+        """
+        if (config.SC2_CPU_AFFINITY is None and config.PLAYER1_CPU_AFFINITY is None
+                and config.PLAYER2_CPU_AFFINITY is None):
+            return None
+        if config.SYSTEM != "Linux":
+            raise Exception("*_CPU_AFFINITY is only supported on Linux!")
+        return CpuPlacement(config)
+
+    def for_player(self, player_number: int) -> set:
+        return self.player1 if player_number == 1 else self.player2
+
+    def describe(self, match) -> str:
+        """
+        Placement of a match, for the match log.
+
+        :param match:
+        :return:
+        """
+        def cpus(cpu_set):
+            return format_cpu_list(cpu_set) if cpu_set is not None else "any"
+
+        return (f"CPU placement: SC2 on {cpus(self.sc2)}, {match.bot1.name} on {cpus(self.player1)}, "
+                f"{match.bot2.name} on {cpus(self.player2)}")
+
+    def pin_sc2(self, pids: list):
+        """
+        Pin the SC2 instance of this match to its CPUs. SC2 is already running, so each of its threads is pinned.
+
+        :param pids: the SC2 processes of this match, found by SC2Locator
+        :return:
+        """
+        if self.sc2 is None:
+            return
+        if not pids:
+            self._utl.printout(f"WARNING: No SC2 process to pin to CPUs {format_cpu_list(self.sc2)}")
+            return
+        for pid in pids:
+            try:
+                self._utl.printout(f"Pinning SC2 (PID {pid}) to CPUs {format_cpu_list(self.sc2)}")
+                for thread in psutil.Process(pid).threads():
+                    try:
+                        os.sched_setaffinity(thread.id, self.sc2)
+                    except ProcessLookupError:
+                        pass  # thread exited
+            except (psutil.Error, OSError) as e:
+                self._utl.printout(f"ERROR: Failed to pin SC2 (PID {pid}) to CPUs {format_cpu_list(self.sc2)}: {e}")
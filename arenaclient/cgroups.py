@@ -0,0 +1,172 @@
+import os
+
+from .utl import Utl
+
+
+class MatchCgroups:
+    """
+    Optional cgroup v2 backend that runs each bot and the SC2 instance of a match in a cgroup of its own, limited by
+    the BOT_* and SC2_* CPU quota, cpuset and memory config values.
+
+    All cgroups are created directly below CGROUP_ROOT, which has to be a delegated cgroup the arena client may write
+    to and must not contain the arena client itself. The cgroups of a match are kept until the next match of the
+    same slot starts, so their peak memory and CPU time can still be read after the processes have exited.
+    """
+
+    GROUPS = {"bot1": "BOT", "bot2": "BOT", "sc2": "SC2"}  # cgroup -> config prefix of its limits
+    CONTROLLERS = ("cpu", "cpuset", "memory")
+    CPU_PERIOD = 100000  # microseconds
+
+    def __init__(self, config):
+        self._config = config
+        self._utl = Utl(config)
+        self.root = config.CGROUP_ROOT
+        self._prefix = f"slot_{getattr(config, 'SLOT_ID', 0)}_"
+        self._match_id = None
+
+    @staticmethod
+    def from_config(config):
+        """
+        Creates the cgroup backend if CGROUP_ROOT is set.
+
+        :param config:
+        :return: MatchCgroups or None
+        """
+        if config.CGROUP_ROOT is None:
+            return None
+        if config.SYSTEM != "Linux":
+            raise Exception("CGROUP_ROOT is only supported on Linux!")
+        return MatchCgroups(config)
+
+    def path(self, name: str) -> str:
+        """
+        Path of one of the cgroups of the current match.
+
+        :param name: bot1, bot2 or sc2
+        :return:
+        """
+        return os.path.join(self.root, f"{self._prefix}{self._match_id}_{name}")
+
+    def prepare(self, match_id):
+        """
+        Remove the cgroups of earlier matches of this slot and create the cgroups for the next match.
+
+        :param match_id:
+        :return:
+        """
+        self.remove_stale()
+        self._match_id = match_id
+        available = self._read(os.path.join(self.root, "cgroup.controllers")).split()
+        controllers = [controller for controller in MatchCgroups.CONTROLLERS if controller in available]
+        if controllers:
+            self._write(os.path.join(self.root, "cgroup.subtree_control"),
+                        " ".join(f"+{controller}" for controller in controllers))
+
+        for name, prefix in MatchCgroups.GROUPS.items():
+            path = self.path(name)
+            os.makedirs(path, exist_ok=True)
+            limits = {
+                "cpu.max": self._cpu_max(getattr(self._config, f"{prefix}_CPU_QUOTA")),
+                "cpuset.cpus": getattr(self._config, f"{prefix}_CPUSET"),
+                "memory.max": getattr(self._config, f"{prefix}_MEMORY_MAX"),
+            }
+            for limit_file, value in limits.items():
+                if value is None:
+                    continue
+                if limit_file.split(".")[0] not in controllers:
+                    self._utl.printout(f"ERROR: Can't set {limit_file} of {path}, the controller isn't available")
+                    continue
+                self._write(os.path.join(path, limit_file), str(value))
+
+    @staticmethod
+    def _cpu_max(quota):
+        if quota is None:
+            return None
+        return f"{int(quota * MatchCgroups.CPU_PERIOD)} {MatchCgroups.CPU_PERIOD}"
+
+    @staticmethod
+    def join(path: str):
+        """
+        Move the calling process into a cgroup. Meant to be called from a preexec_fn, before privileges are dropped.
+
+        :param path:
+        :return:
+        """
+        with open(os.path.join(path, "cgroup.procs"), "w") as procs:
+            procs.write(str(os.getpid()))
+
+    def add_process(self, name: str, pid: int):
+        """
+        Move a running process into one of the cgroups of the current match.
+
+        :param name: bot1, bot2 or sc2
+        :param pid:
+        :return:
+        """
+        try:
+            self._write(os.path.join(self.path(name), "cgroup.procs"), str(pid))
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to move PID {pid} to {self.path(name)}: {e}")
+
+    def adopt_sc2(self, pids: list):
+        """
+        Move the SC2 instance of this match into its cgroup.
+
+        :param pids: the SC2 processes of this match, found by SC2Locator
+        :return:
+        """
+        if not pids:
+            self._utl.printout(f"WARNING: No SC2 process to move into {self.path('sc2')}")
+            return
+        for pid in pids:
+            self.add_process("sc2", pid)
+
+    def usage(self, name: str) -> dict:
+        """
+        Peak memory and CPU time of one of the cgroups of the current match.
+        Values the kernel doesn't provide are None.
+
+        :param name: bot1, bot2 or sc2
+        :return: {"PeakMemory": bytes, "CpuTime": seconds}
+        """
+        usage = {"PeakMemory": None, "CpuTime": None}
+        try:
+            usage["PeakMemory"] = int(self._read(os.path.join(self.path(name), "memory.peak")))
+        except (OSError, ValueError):
+            pass  # memory.peak needs the memory controller and Linux 5.19
+        try:
+            for line in self._read(os.path.join(self.path(name), "cpu.stat")).splitlines():
+                key, value = line.split()
+                if key == "usage_usec":
+                    usage["CpuTime"] = int(value) / 1000000
+        except (OSError, ValueError):
+            pass
+        return usage
+
+    def remove_stale(self):
+        """
+        Kill whatever is left in the cgroups of earlier matches of this slot and remove them.
+        Cgroups whose processes haven't exited yet are removed on the next call.
+
+        :return:
+        """
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if not entry.startswith(self._prefix) or not os.path.isdir(path):
+                continue
+            try:
+                if os.path.isfile(os.path.join(path, "cgroup.kill")):
+                    self._write(os.path.join(path, "cgroup.kill"), "1")
+                os.rmdir(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _read(path) -> str:
+        with open(path, "r") as f:
+            return f.read().strip()
+
+    @staticmethod
+    def _write(path, value: str):
+        with open(path, "w") as f:
+            f.write(value)
@@ -1,5 +1,6 @@
 import asyncio
 import datetime
+import functools
 import json
 from aiohttp import ClientTimeout
 from loguru import logger
@@ -10,9 +11,16 @@ import subprocess
 import time
 import traceback
 import hashlib
+from typing import Optional
+
 import aiohttp
 import psutil
+from .affinity import CpuPlacement
+from .cgroups import MatchCgroups
 from .match.matches import MatchSourceFactory, MatchSource
+from .process_registry import ProcessRegistry, SC2Locator
+from .proxy_messages import ProxyMessageDispatcher, loads
+from .sc2_warmup import SC2Warmup
 from .utl import Utl
 from .match.result import Result
 
@@ -43,53 +51,74 @@ def init_error(match: MatchSource.Match):
     }
 
 
-async def connect(address: str, headers=None):
-    """
-    Connects to address with headers
+async def connect(address: str, headers=None, timeout: float = 30, max_backoff: float = 2):
     """
-    ws, session = None, None
-    for i in range(60):
-        await asyncio.sleep(1)
-        try:
-            session = aiohttp.ClientSession(timeout=ClientTimeout(connect=20, sock_read=120 * 60, sock_connect=20))
-            ws = await session.ws_connect(address, headers=headers)
-            logger.debug("Websocket connection ready")
-            return ws, session
-        except aiohttp.client_exceptions.ClientConnectorError:
-            await session.close()
-            if i > 15:
-                logger.debug("Connection refused (startup not complete (yet))")
-                return None, None
-        except asyncio.TimeoutError:
-            await session.close()
-            if i > 15:
-                logger.debug("Connection timed out (startup not complete (yet))")
-                return None, None
-
-    return ws, session
+    Connects to address with headers.
 
-
-def complete(msg):
+    Attempts are retried with a bounded exponential backoff until the proxy accepts the connection or timeout
+    seconds have passed. All attempts share one session, which is closed again unless the connection succeeds.
     """
-    Checks if msg status is complete.
+    session = aiohttp.ClientSession(timeout=ClientTimeout(connect=20, sock_read=120 * 60, sock_connect=20))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    backoff = 0.05
+    try:
+        while True:
+            try:
+                ws = await session.ws_connect(address, headers=headers)
+                logger.debug("Websocket connection ready")
+                return ws, session
+            except (aiohttp.client_exceptions.ClientConnectorError, asyncio.TimeoutError) as e:
+                if loop.time() + backoff > deadline:
+                    logger.debug(f"Failed to connect to {address}: {e}")
+                    await session.close()
+                    return None, None
+                logger.debug(f"Proxy not ready yet ({e}), retrying in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+    except BaseException:
+        # Anything else, like a failed handshake or cancellation, must not leak the session
+        await session.close()
+        raise
+
+
+async def wait_for_exit(process: subprocess.Popen):
     """
-    return msg.get("Status", None) == "Complete"
-
-
-def valid_msg(msg):
+    Waits for a process to exit without blocking the event loop.
+    Uses a pidfd where the platform supports it and waits in a thread otherwise.
     """
-    Looks for keywords in the message so that the result can be parsed.
-    @param msg:
-    @return:
+    loop = asyncio.get_running_loop()
+    pidfd = None
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except OSError:
+            pass  # kernel without pidfd support, or the process has already been reaped
+    if pidfd is None:
+        return await loop.run_in_executor(None, process.wait)
+
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    return process.wait()
+
+
+class MatchState:
+    """
+    What a match has started so far, for the phases of Client.main and its teardown.
     """
-    if 'Result' in msg:
-        return True
-    elif 'GameTime' in msg:
-        return True
-    elif 'AverageFrameTime' in msg:
-        return True
-    else:
-        return False
+
+    def __init__(self, match: MatchSource.Match, result: Result):
+        self.match = match
+        self.result = result
+        self.processes = [None, None]  # bot1 and bot2, once they connected to the proxy
+        self.pids = []  # of every bot started, connected or not
+        self.sc2_pids = []  # of the SC2 instances the proxy launched for this match
+        self.bot_watcher: Optional[asyncio.Future] = None
 
 
 class Client:
@@ -103,8 +132,15 @@ class Client:
 
         self._logger = logger
         self._match_source = MatchSourceFactory.build_match_source(self._config)
-        self._ws: aiohttp.client._WSRequestContextManager = ...
-        self._session: aiohttp.ClientSession = ...
+        self._processes = ProcessRegistry(self._config)
+        self._cgroups = MatchCgroups.from_config(self._config)
+        self._cpu_placement = CpuPlacement.from_config(self._config)
+        # Only needed to move SC2 into its cgroup and onto its CPUs, the proxy reports the PIDs to kill
+        self._sc2_locator = (SC2Locator(self._config) if self._cgroups is not None or self._cpu_placement is not None
+                             else None)
+        self._sc2_warmup = SC2Warmup.from_config(self._config)
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._session: Optional[aiohttp.ClientSession] = None
 
     @staticmethod
     def get_opponent_id(bot_name):
@@ -169,7 +205,7 @@ class Client:
         :return:
         """
         self._utl.printout(f'New match started at {time.strftime("%H:%M:%S", time.gmtime(time.time()))}')
-        match = self._match_source.next_match()
+        match = await self._match_source.next_match()
         if match is None:
             # todo: this needs to return true because otherwise a file based match source will cause an infinite loop
             # todo: work out a way to fix this
@@ -179,7 +215,7 @@ class Client:
             match_count,
             match
         )
-        self._match_source.submit_result(match, result)
+        await self._match_source.submit_result(match, result)
         return
 
     def cleanup(self):
@@ -211,7 +247,7 @@ class Client:
         msg = await self._ws.receive(timeout)
         if msg.type == aiohttp.WSMsgType.CLOSED:
             raise WSClosed("Websocket connection closed")
-        return msg.json()
+        return msg.json(loads=loads)
 
     async def send(self, msg: str):
         """
@@ -221,28 +257,46 @@ class Client:
         """
         await self._ws.send_str(msg)
 
-    async def connected(self):
+    async def disconnect(self):
+        """
+        Close the websocket connection and its session.
+        @return:
+        """
+        if self._ws is not None:
+            await self._ws.close()
+        if self._session is not None:
+            await self._session.close()
+
+    async def connected(self, timeout=None):
         """
         Check to see if client is connected to websocket server.
 
+        @param timeout: seconds, raises asyncio.TimeoutError when they pass
         @return:
         """
-        msg = await self.receive()
+        msg = await self.receive(timeout)
 
         if msg.get("Status") == "Connected":
             return True
         else:
             raise WrongStatusException(f"Expected Connected Status, got {msg}")
 
-    async def start_bot(self, bot, opponent_id):
+    async def start_bot(self, bot, opponent_id, player_number: int):
         """
         Start the bot with the correct arguments.
 
         :param bot:
         :param opponent_id:
+        :param player_number:
         :return:
         """
-        process = bot.start_bot(opponent_id)
+        process = bot.start_bot(
+            opponent_id,
+            cgroup=self._cgroups.path(f"bot{player_number}") if self._cgroups is not None else None,
+            cpus=self._cpu_placement.for_player(player_number) if self._cpu_placement is not None else None,
+        )
+        # Linux bots lead their own process group, so the whole group can be killed
+        self._processes.register(process.pid, bot.name, process.pid if self._config.SYSTEM == "Linux" else None)
         try:
             msg = await self.receive(40)
         except:
@@ -253,230 +307,295 @@ class Client:
         else:
             return None, process.pid
 
+    async def watch_bots(self, match: MatchSource.Match, result: Result, processes: list, pids: list):
+        """
+        Ends the game as soon as a bot crashes before the proxy sent a result. A bot that exits with returncode 0
+        left the game on its own, so the proxy is left to report that result.
+
+        :param match:
+        :param result:
+        :param processes: the processes of bot1 and bot2
+        :param pids:
+        :return:
+        """
+        exits = {asyncio.ensure_future(wait_for_exit(process)): player
+                 for player, process in enumerate(processes, start=1)}
+        try:
+            pending = set(exits.keys())
+            crashed = []
+            while pending and not crashed:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for exit_future in done:
+                    player = exits[exit_future]
+                    returncode = processes[player - 1].returncode
+                    self._utl.printout(f"Bot{player} exited with returncode {returncode}")
+                    if returncode != 0:
+                        crashed.append(player)
+            if not crashed or result.has_result():
+                return
+            # Bots leaving at the end of the game can exit just before the proxy sends the result
+            await asyncio.sleep(self._config.BOT_EXIT_GRACE_TIME)
+            if result.has_result():
+                return
+
+            crashed = min(crashed)
+            self._utl.printout(f"Bot{crashed} Crash (returncode {processes[crashed - 1].returncode})")
+            result.parse_result(
+                {
+                    "Result": {
+                        match.bot1.name: "Crash" if crashed == 1 else "Victory",
+                        match.bot2.name: "Crash" if crashed == 2 else "Victory",
+                    }
+                }
+            )
+            self._processes.kill(pids)
+            # Closing the websocket ends main, which cancels this task, so don't let that cut the close short
+            await asyncio.shield(self.disconnect())
+        finally:
+            for exit_future in exits:
+                exit_future.cancel()
+
     async def main(self, match: MatchSource.Match):
         """
         Method to interact with the match runner. Sends the config and awaits the result.
 
+        The match runs through the phases Connect, Config, LaunchBot1, LaunchBot2 and Play, each of which returns the
+        name of the next one. Any phase can end the match early by returning "Finalize", which tears down whatever
+        was started. The time every phase is entered, and the time teardown is Done, is recorded in the result.
+        Play turns into ReplayWait once the proxy sent the result.
+
         :param match:
         :return:
         """
-        result = Result(match, self._config)
-        bot1_process = None
-        bot2_process = None
-        pids = []
+        state = MatchState(match, Result(match, self._config))
+        phases = {
+            "Connect": self._connect_phase,
+            "Config": self._config_phase,
+            "LaunchBot1": self._launch_bot1_phase,
+            "LaunchBot2": self._launch_bot2_phase,
+            "Play": self._play_phase,
+        }
+        phase = "Connect"
+        try:
+            while phase != "Finalize":
+                state.result.enter_phase(phase)
+                phase = await phases[phase](state)
+        except WSClosed:
+            print(traceback.format_exc())
+            if not state.result.has_result():
+                state.result.parse_result(self.error)
+        finally:
+            state.result.enter_phase("Finalize")
+            await self.teardown(state)
+            state.result.enter_phase("Done")
+        return state.result
+
+    async def _connect_phase(self, state: "MatchState") -> str:
+        if self._sc2_locator is not None:
+            # Ended once SC2 has been found, or by the teardown
+            await self._sc2_locator.begin_startup()
+        self._ws, self._session = await connect(address=self.address, headers=self.headers)
+        if self._ws is None:
+            state.result.parse_result(self.error)
+            return "Finalize"
         try:
-            self._ws, self._session = await connect(address=self.address, headers=self.headers)
-
-            if await self.connected():
-                await self.send(json.dumps(self.json_config(match)))
-
-                _ = await self.receive()
-                self._logger.debug(f"Starting bots...")
-                await asyncio.sleep(3)
-                bot1_process, bot1_pid = await self.start_bot(match.bot1,
-                                                              match.bot2.bot_json.get("botID", self.get_opponent_id(
-                                                                  match.bot2.name)))
-                pids.append(bot1_pid)
-                if bot1_process is not None:
-                    await asyncio.sleep(3)
-                    bot2_process, bot2_pid = await self.start_bot(match.bot2,
-                                                                  match.bot1.bot_json.get("botID", self.get_opponent_id(
-                                                                      match.bot2.name)))
-                    pids.append(bot2_pid)
-                    if bot2_process is None:
-                        self._logger.debug(f"Failed to launch {match.bot2.name}")
-                        await self.send("Reset")
-                        _ = await self._ws.receive()  # Receive confirmation
-                        result.parse_result(init_error(match))
-                        try:
-                            bot1_process.communicate(timeout=0.2)
-                        except subprocess.TimeoutExpired:
-                            pass
-                        self._utl.pid_cleanup(pids)
-                        await self._ws.close()
-                        await self._session.close()
-                        return result
-                else:
-                    self._logger.debug(f"Failed to launch {match.bot1.name}")
-                    await self.send("Reset")
-                    _ = await self._ws.receive()  # Receive confirmation
-                    result.parse_result(init_error(match))
-                    self._utl.pid_cleanup(pids)
-                    await self._ws.close()
-                    await self._session.close()
-                    self._utl.pid_cleanup(pids)
-                    return result
-
-                # Change PID Group
-                self._logger.debug(f"Changing PGID")
-                self._utl.move_pids(pids)
-
-                # Bot health check
-                self._logger.debug(f"Checking if bot is okay")
-                if bot1_process.poll():
-                    self._logger.debug(f"Bot1 crash")
-                    result.parse_result(init_error(match))
-
-                    # Flush stdout
-                    try:
-                        bot1_process.communicate(timeout=0.2)
-                    except subprocess.TimeoutExpired:
-                        pass
-                    try:
-                        bot2_process.communicate(timeout=0.2)
-                    except subprocess.TimeoutExpired:
-                        pass
-                    self._utl.pid_cleanup(pids)
-                    await self._ws.close()
-                    await self._session.close()
-                    return result
-
-                else:
-                    await self.send(json.dumps({"Bot1": True}))
-
-                if bot2_process.poll():
-                    self._logger.debug(f"Bot2 crash")
-                    result.parse_result(init_error(match))
-                    try:
-                        bot1_process.communicate(timeout=0.2)
-                    except subprocess.TimeoutExpired:
-                        pass
-                    try:
-                        bot2_process.communicate(timeout=0.2)
-                    except subprocess.TimeoutExpired:
-                        pass
-                    self._utl.pid_cleanup(pids)
-                    await self._ws.close()
-                    await self._session.close()
-                    return result
-
-                else:
-                    await self.send(json.dumps({"Bot2": True}))
-
-            async for msg in self._ws:
-                if msg.type == aiohttp.WSMsgType.CLOSED:
-                    if not result.has_result():
-                        result.parse_result(self.error)
-                    self._utl.pid_cleanup(pids)
-                    return result
-
-                msg = msg.json()
-
-                if "PID" in msg:
-                    try:
-                        bot1_process.communicate(timeout=0.2)
-                    except subprocess.TimeoutExpired:
-                        pass
-                    try:
-                        bot2_process.communicate(timeout=0.2)
-                    except subprocess.TimeoutExpired:
-                        pass
-                    self._utl.pid_cleanup(pids)  # Terminate bots first
-
-                if valid_msg(msg):
-                    result.parse_result(msg)
-
-                if 'Error' in msg:
-                    self._utl.printout(msg)
-                    if not result.has_result():
-                        result.parse_result(self.error)
-                    await self._ws.close()
-                    await self._session.close()
-
-                if 'StillAlive' in msg:
-                    if bot1_process.poll():
-                        self._utl.printout("Bot1 Crash")
-                        await self._ws.close()
-                        await self._session.close()
-                        if not result.has_result():
-                            result.parse_result(
-                                {
-                                    "Result": {
-                                        match.bot1.name: "Result.Crashed",
-                                        match.bot2.name: "Result.Victory",
-                                    }
-                                }
-                            )
-                        try:
-                            bot1_process.communicate(timeout=0.2)
-                        except subprocess.TimeoutExpired:
-                            pass
-                        try:
-                            bot2_process.communicate(timeout=0.2)
-                        except subprocess.TimeoutExpired:
-                            pass
-                        self._utl.pid_cleanup(pids)
-
-                    if bot2_process.poll():
-                        self._utl.printout("Bot2 Crash")
-                        await self._ws.close()
-                        await self._session.close()
-                        if not result.has_result():
-                            result.parse_result(
-                                {
-                                    "Result": {
-                                        match.bot1.name: "Result.Victory",
-                                        match.bot2.name: "Result.Crashed",
-                                    }
-                                }
-                            )
-                        try:
-                            bot1_process.communicate(timeout=0.2)
-                        except subprocess.TimeoutExpired:
-                            pass
-                        try:
-                            bot2_process.communicate(timeout=0.2)
-                        except subprocess.TimeoutExpired:
-                            pass
-                        self._utl.pid_cleanup(pids)
-
-                if complete(msg):
-                    result.parse_result(
-                        {"TimeStamp": datetime.datetime.utcnow().strftime("%d-%m-%Y %H-%M-%SUTC")}
-                    )
-                    await self._ws.close()
-                    await self._session.close()
+            await self.connected(self._config.PROXY_STARTUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._utl.printout(f"ERROR: The proxy didn't report Connected within {self._config.PROXY_STARTUP_TIMEOUT}s")
+            state.result.parse_result(self.error)
+            return "Finalize"
+        return "Config"
+
+    async def _config_phase(self, state: "MatchState") -> str:
+        await self.send(json.dumps(self.json_config(state.match)))
+        try:
+            msg = await self.receive(self._config.PROXY_STARTUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._utl.printout(f"ERROR: The proxy didn't acknowledge the config within "
+                               f"{self._config.PROXY_STARTUP_TIMEOUT}s")
+            state.result.parse_result(self.error)
+            return "Finalize"
+        self._logger.debug(f"Config acknowledged: {msg}")
+        return "LaunchBot1"
+
+    async def _launch_bot1_phase(self, state: "MatchState") -> str:
+        self._logger.debug(f"Starting bots...")
+        # The proxy accepts bots once it acknowledged the config, and start_bot waits until the bot connected
+        return await self._launch_bot(state, 1, "LaunchBot2")
+
+    async def _launch_bot2_phase(self, state: "MatchState") -> str:
+        next_phase = await self._launch_bot(state, 2, "Play")
+        if next_phase == "Finalize":
+            return next_phase
+        self._utl.printout(f"Startup took {time.time() - state.result.phases['Connect']:.3f}s: "
+                           f"{state.result.phase_durations()}")
+
+        # Change PID Group
+        self._logger.debug(f"Changing PGID")
+        await self._utl.move_pids(state.pids)
+
+        # Bot health check
+        self._logger.debug(f"Checking if bot is okay")
+        for player_number, process in enumerate(state.processes, start=1):
+            if process.poll():
+                self._logger.debug(f"Bot{player_number} crash")
+                state.result.parse_result(init_error(state.match))
+                return "Finalize"
+            await self.send(json.dumps({f"Bot{player_number}": True}))
+
+        if self._sc2_locator is not None:
+            state.sc2_pids = [process.pid for process in await self._sc2_locator.find()]
+            self._sc2_locator.end_startup()
+        for sc2_pid in state.sc2_pids:
+            self._processes.register(sc2_pid, "SC2")
+        if self._cgroups is not None:
+            self._cgroups.adopt_sc2(state.sc2_pids)
+        if self._cpu_placement is not None:
+            self._cpu_placement.pin_sc2(state.sc2_pids)
+        return next_phase
+
+    async def _launch_bot(self, state: "MatchState", player_number: int, next_phase: str) -> str:
+        bot, opponent = ((state.match.bot1, state.match.bot2) if player_number == 1
+                         else (state.match.bot2, state.match.bot1))
+        process, pid = await self.start_bot(
+            bot, opponent.bot_json.get("botID", self.get_opponent_id(opponent.name)), player_number
+        )
+        state.pids.append(pid)
+        if process is None:
+            self._logger.debug(f"Failed to launch {bot.name}")
+            await self.send("Reset")
+            _ = await self._ws.receive()  # Receive confirmation
+            state.result.parse_result(init_error(state.match))
+            return "Finalize"
+        state.processes[player_number - 1] = process
+        return next_phase
+
+    async def _play_phase(self, state: "MatchState") -> str:
+        result = state.result
+        state.bot_watcher = asyncio.ensure_future(self.watch_bots(state.match, result, state.processes, state.pids))
+
+        dispatcher = self.message_dispatcher(result, state.processes, state.pids, state.bot_watcher)
+        async for msg in self._ws:
+            if msg.type == aiohttp.WSMsgType.CLOSED:
+                if not result.has_result():
+                    result.parse_result(self.error)
+                break
+            if msg.type not in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                continue
+
+            await dispatcher.dispatch(loads(msg.data))
+
+            if self._config.PROXY_MESSAGE_ACK and not self._ws.closed:
                 try:
                     await self._ws.send_str("Received")
                 except:
                     pass
+        result.timings["ProxyMessages"] = dispatcher.stats()
+        self._logger.debug(f"Proxy messages: {result.timings['ProxyMessages']}")
 
-            if not result.has_result():
-                result.parse_result(init_error(match))
-            self._utl.pid_cleanup(pids)
-            return result
-        except WSClosed:
-            print(traceback.format_exc())
+        if not result.has_result():
+            result.parse_result(init_error(state.match))
+        return "Finalize"
+
+    async def teardown(self, state: "MatchState"):
+        """
+        Stop everything a match started, however far it got: flush and kill the bots and close the connection to
+        the proxy, all at the same time.
+
+        :param state:
+        :return:
+        """
+        if state.bot_watcher is not None:
+            state.bot_watcher.cancel()
+        if self._sc2_locator is not None and self._sc2_locator.holding:
+            # The match ended during startup, so kill_current_server has to know about the SC2 already launched
+            for process in self._sc2_locator.launched():
+                self._processes.register(process.pid, "SC2")
+            self._sc2_locator.end_startup()
+        await asyncio.gather(self.stop_bots(state.processes, state.pids), self.disconnect(), return_exceptions=True)
+
+    async def stop_bots(self, processes: list, pids: list):
+        """
+        Give the bots a moment to flush their output, all at the same time, then kill them.
+
+        :param processes: bot processes, None for bots that didn't start
+        :param pids: bot PIDs
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+
+        async def flush(process):
+            try:
+                await loop.run_in_executor(None, functools.partial(process.communicate, timeout=0.2))
+            except subprocess.TimeoutExpired:
+                pass
+
+        await asyncio.gather(*(flush(process) for process in processes if process is not None))
+        self._processes.kill(pids)
+
+    def message_dispatcher(self, result: Result, processes: list, pids: list, bot_watcher) -> ProxyMessageDispatcher:
+        """
+        Handlers for the messages the proxy sends while the match is running.
+
+        :param result:
+        :param processes: bot processes
+        :param pids: bot PIDs
+        :param bot_watcher: task watching the bots, cancelled once the proxy is done with them
+        :return:
+        """
+        dispatcher = ProxyMessageDispatcher()
+
+        async def on_pid(msg):
+            bot_watcher.cancel()  # The proxy is done with the bots
+            for sc2_pid in msg["PID"] if isinstance(msg["PID"], list) else [msg["PID"]]:
+                if isinstance(sc2_pid, int):
+                    self._processes.register(sc2_pid, "SC2")
+            await self.stop_bots(processes, pids)  # Terminate bots first
+
+        async def on_result(msg):
+            if "Result" in msg and "ReplayWait" not in result.phases:
+                result.enter_phase("ReplayWait")  # until the proxy reports the match complete
+            result.parse_result(msg)
+
+        async def on_error(msg):
+            self._utl.printout(msg)
             if not result.has_result():
                 result.parse_result(self.error)
-            self._utl.pid_cleanup(pids)
-            return result
-
-    def kill_current_server(self, server=False):
+            await self.disconnect()
+
+        async def on_status(msg):
+            if msg["Status"] == "Complete":
+                result.parse_result(
+                    {"TimeStamp": datetime.datetime.utcnow().strftime("%d-%m-%Y %H-%M-%SUTC")}
+                )
+                await self.disconnect()
+
+        dispatcher.register("PID", on_pid)
+        dispatcher.register(("Result", "GameTime", "AverageFrameTime"), on_result)
+        dispatcher.register("Error", on_error)
+        dispatcher.register("Status", on_status)
+        return dispatcher
+
+    def kill_current_server(self):
         """
-        Kills all the processes running on the match runner's port. Also kills any SC2 processes if
-        they are still running.
+        Kills the bots and SC2 processes started for the previous match.
+
+        The processes are killed through the process registry, which holds the SC2 processes SC2Locator found for
+        this slot and the ones the proxy reported. If neither knew of any, SC2 processes started by this arena client
+        are looked up among its own child processes. That lookup is skipped when several matches run in parallel,
+        because their SC2 processes can't be told apart.
 
         :return:
         """
         try:
-            if self._config.SYSTEM == "Linux":
-                self._utl.printout("Killing SC2")
-                os.system("pkill -f SC2_x64")
-                if server:
-                    os.system(f"lsof -ti tcp:{self._config.SC2_PROXY['PORT']} | xargs kill")
-            for process in psutil.process_iter():
-                if server:
-                    for conns in process.connections(kind="inet"):
-                        if conns.laddr.port == self._config.SC2_PROXY["PORT"]:
-                            process.send_signal(signal.SIGTERM)
-                if process.name() == "SC2_x64.exe":
-                    try:
+            sc2_tracked = self._processes.is_tracking("SC2")
+            self._processes.kill_all()
+            if not sc2_tracked and self._config.PARALLEL_MATCHES == 1:
+                for process in psutil.Process().children(recursive=True):
+                    if process.name().startswith("SC2"):
+                        self._utl.printout(f"Killing SC2 (PID {process.pid})")
                         process.send_signal(signal.SIGTERM)
-                    except psutil.AccessDenied:
-                        pass
-
-        except:
+        except psutil.Error:
             pass
 
     async def run_match(self, match_count, match: MatchSource.Match):
@@ -487,10 +606,26 @@ class Client:
         :param match_count:
         :return:
         """
+        start = time.monotonic()
+        prepare_timings = {}  # seconds spent on each step before the match starts
+        cgroups_prepared = False
         try:
             self._utl.printout(f"Starting game - Round {match_count}")
             self._utl.printout(f"{match.bot1.name} vs {match.bot2.name}")
+            if self._cpu_placement is not None:
+                self._utl.printout(self._cpu_placement.describe(match))
             self.kill_current_server()
+            prepare_timings["KillPrevious"] = round(time.monotonic() - start, 3)
+            if self._cgroups is not None:
+                step_start = time.monotonic()
+                self._cgroups.prepare(match.id)
+                cgroups_prepared = True
+                prepare_timings["Cgroups"] = round(time.monotonic() - step_start, 3)
+            if self._sc2_warmup is not None:
+                step_start = time.monotonic()
+                await asyncio.get_running_loop().run_in_executor(None, self._sc2_warmup.warm, match.map_name)
+                prepare_timings["Warmup"] = round(time.monotonic() - step_start, 3)
+            prepare_timings["Total"] = round(time.monotonic() - start, 3)
 
             result = await self.main(match)
 
@@ -499,7 +634,15 @@ class Client:
             result = Result(match, self._config)
             result.parse_result(self.error)
 
+        result.add_preparation_timings(match)
+        if prepare_timings:
+            result.timings["Prepare"] = prepare_timings
+
+        if cgroups_prepared:
+            result.set_resource_usage(self._cgroups.usage("bot1"), self._cgroups.usage("bot2"))
+
         logger.info(result)
+        self._utl.printout(f"Timings: {result.timings_json()}")
 
         return result
 
@@ -514,6 +657,9 @@ class Client:
 
             os.chdir(self._config.WORKING_DIRECTORY)
 
+            # Anything a crashed previous run left behind
+            self._processes.reap_stale()
+
             os.makedirs(self._config.REPLAYS_DIRECTORY, exist_ok=True)
 
             if not self._config.RUN_LOCAL:
@@ -534,13 +680,17 @@ class Client:
                 except Exception as e:
                     self._utl.printout(traceback.format_exc())
                     self._utl.printout(f"arena-client encountered an uncaught exception: {e} Sleeping...")
-                    time.sleep(30)
+                    await asyncio.sleep(30)
 
         except Exception as e:
             self._utl.printout(traceback.format_exc())
             self._utl.printout(f"arena-client encountered an uncaught exception during startup: {e} Exiting...")
         finally:
-            self.kill_current_server(server=False)
+            self.kill_current_server()
+            try:
+                await self._match_source.close()
+            except Exception:
+                self._utl.printout(traceback.format_exc())
             try:
                 if self._config.CLEANUP_BETWEEN_ROUNDS:
                     self.cleanup()
@@ -16,7 +16,8 @@ from ..match.matches import FileMatchSource
 
 ARENA_CLIENT_ID = "aiarenaclient_000"  # ID of arenaclient. Used for AiArena
 API_TOKEN = "12345"  # API Token to retrieve matches and submit results. Used for AiArena
-ROUNDS_PER_RUN = 5  # Set to -1 to ignore this
+# Matches to play per match slot, so a run plays PARALLEL_MATCHES * ROUNDS_PER_RUN matches. Set to -1 to ignore this
+ROUNDS_PER_RUN = 5
 BASE_WEBSITE_URL = ""
 USE_PID_CHECK = False
 RUN_REPLAY_CHECK = False  # Validate replays
@@ -26,6 +27,11 @@ RUN_LOCAL = False  # Run on AiArena or locally
 CLEANUP_BETWEEN_ROUNDS = True  # Clean up files between rounds
 SYSTEM = platform.system()  # What OS are we on?
 SC2_PROXY = {"HOST": "127.0.0.1", "PORT": 8765}  # On which host and port to run the proxy between SC2 and bots
+# Number of matches to run at the same time. Slot N uses proxy port SC2_PROXY["PORT"] + N and its own sub folders.
+PARALLEL_MATCHES = 1
+# Per slot config overrides, e.g. {0: {"RUN_PLAYER1_AS_USER": "bot_player1"}, 1: {...}}. Also applied to the only
+# slot when PARALLEL_MATCHES is 1.
+PARALLEL_SLOT_OVERRIDES = {}
 
 # Secure mode will ignore the BOTS_DIRECTORY config setting and instead run each bot in their home directory.
 SECURE_MODE = False
@@ -36,6 +42,8 @@ RUN_PLAYER2_AS_USER = None
 # LOGGING
 LOGGING_HANDLER = logging.FileHandler("../supervisor.log", "a+")
 LOGGING_LEVEL = logging.DEBUG
+LOG_VERBOSITY = 1  # Set to 2 to also log every file touched while installing bots
+LOG_FLUSH_INTERVAL = 1  # seconds between flushes of LOG_FILE
 
 # PATHS AND FILES
 TEMP_ROOT = "/tmp/"
@@ -43,15 +51,68 @@ TEMP_PATH = os.path.join(TEMP_ROOT, "aiarena")
 LOCAL_PATH = os.path.dirname(__file__)
 WORKING_DIRECTORY = LOCAL_PATH  # same for now
 LOG_FILE = os.path.join(WORKING_DIRECTORY, "client.log")
+# Log of the proxies of all match slots. Each result gets the part written since the previous result of its slot
+PROXY_LOG_FILE = os.path.join(WORKING_DIRECTORY, "proxy.log")
+PROXY_LOG_MAX_SIZE = 100 * 1024 ** 2  # bytes, the log is rotated to PROXY_LOG_FILE.1 beyond this
+PROCESS_REGISTRY_FILE = os.path.join(WORKING_DIRECTORY, "processes.json")  # PIDs of the bots and SC2 we started
 REPLAYS_DIRECTORY = os.path.join(WORKING_DIRECTORY, "replays")
 BOTS_DIRECTORY = os.path.join(WORKING_DIRECTORY, "bots")  # Ignored when SECURE_MODE == True
 CLEAN_BOT_DIRECTORIES_BEFORE_MATCH_START = True  # a quick fix to stop attempting to clean a non-existent bot directory
+# Claim and download the next match while the current one is running (AiArena only)
+PREFETCH_NEXT_MATCH = False
+PREFETCH_DIRECTORY = os.path.join(WORKING_DIRECTORY, "prefetch")  # Must not be inside TEMP_ROOT
+EXTRACT_THREADS = 4  # Threads used to extract bot zips
+MAX_EXTRACTED_SIZE = 16 * 1024 ** 3  # bytes, bot and bot data zips that extract to more are rejected
+MAX_EXTRACTED_MEMBERS = 200000  # bot and bot data zips with more files and folders are rejected
+MAX_BOT_DOWNLOAD_SIZE = 4 * 1024 ** 3  # bytes, bot and bot data downloads larger than this are aborted
+# Results are spooled here and uploaded in the background (AiArena only). Must not be inside TEMP_ROOT
+RESULT_SPOOL_DIRECTORY = os.path.join(WORKING_DIRECTORY, "result_spool")
+RESULT_UPLOAD_MAX_ATTEMPTS = 60  # Failed results are moved to RESULT_SPOOL_DIRECTORY/failed after this
+RESULT_UPLOAD_BACKOFF_INITIAL = 5  # seconds, doubled after every failed upload
+RESULT_UPLOAD_BACKOFF_MAX = 600  # seconds
+# seconds to wait for queued results on shutdown, the rest stays spooled for the next start. None waits forever
+RESULT_UPLOAD_DRAIN_TIMEOUT = 120
+# Cache downloaded bot zips by their MD5 hash (AiArena only). Set to None to disable. Shared by all match slots.
+BOT_CACHE_DIRECTORY = None
+BOT_CACHE_MAX_SIZE = 20 * 1024 ** 3  # bytes, least recently used bots are evicted first
+# Also cache extracted bots and hard link them into the bot directory instead of extracting. Ignored in secure mode.
+# Only enable this if bots don't modify their own files in place, since those changes would end up in the cache.
+# The data folder is always copied.
+BOT_CACHE_EXTRACTED_TREES = False
+# Keep the last data zip of every bot, so unchanged data is neither downloaded and extracted before a match nor
+# zipped and uploaded after it (AiArena only). Set to None to disable. Shared by all match slots.
+BOT_DATA_CACHE_DIRECTORY = None
+BOT_DATA_CACHE_MAX_SIZE = 20 * 1024 ** 3  # bytes, data of the least recently used bots is evicted first
 
 MATCH_SOURCE_CONFIG = FileMatchSource.FileMatchSourceConfig(
     matches_file=os.path.join(WORKING_DIRECTORY, "matches"),
     results_file=os.path.join(WORKING_DIRECTORY, "results")
 )
 
+# WEBSITE CONNECTIONS
+HTTP_POOL_SIZE = 10  # Kept alive connections per host
+HTTP_TIMEOUT = (20, 300)  # Connect and read timeout in seconds
+HTTP_RETRIES = 3  # Connection errors are always retried, failed responses only for idempotent requests
+HTTP_BACKOFF_FACTOR = 1  # Waits 0s, 2s, 4s, ... between retries
+
+# RESOURCE LIMITS (Linux only)
+# Delegated cgroup v2 directory to run bots and SC2 in, e.g. "/sys/fs/cgroup/aiarena". Set to None to disable.
+# The arena client must be allowed to write to it and must not run inside it.
+CGROUP_ROOT = None
+BOT_CPU_QUOTA = None  # CPU cores per bot, e.g. 1.5
+BOT_CPUSET = None  # CPUs the bots may run on, e.g. "2-5"
+BOT_MEMORY_MAX = None  # bytes per bot
+SC2_CPU_QUOTA = None  # CPU cores for SC2
+SC2_CPUSET = None  # CPUs SC2 may run on, e.g. "0-1"
+SC2_MEMORY_MAX = None  # bytes for SC2
+# CPUs to pin SC2 and the bots to, e.g. "0-1". Set per slot with PARALLEL_SLOT_OVERRIDES. None leaves them unpinned.
+SC2_CPU_AFFINITY = None
+PLAYER1_CPU_AFFINITY = None
+PLAYER2_CPU_AFFINITY = None
+# Spread the slots over the NUMA nodes and give SC2 and each bot of a slot their own CPUs. PARALLEL_SLOT_OVERRIDES
+# still take precedence.
+AUTO_CPU_AFFINITY = False
+
 # STARCRAFT
 SC2_HOME = "/home/aiarena/StarCraftII/"
 SC2_BINARY = os.path.join(SC2_HOME, "Versions/Base75689/SC2_x64")
@@ -59,8 +120,16 @@ MAX_GAME_TIME = 60486
 MAX_REAL_TIME = 7200  # 2 hours in seconds
 MAX_FRAME_TIME = 40
 STRIKES = 10
+BOT_EXIT_GRACE_TIME = 3  # seconds to wait for the result after a bot exited with an error before calling it a crash
+PROXY_STARTUP_TIMEOUT = 60  # seconds to wait for the proxy to report Connected and to acknowledge the config
+# Acknowledge every message of the proxy with "Received". Only disable this with a proxy that doesn't wait for it
+PROXY_MESSAGE_ACK = True
 REALTIME = False
 VISUALIZE = False
+# Have the kernel read these files and the map into memory before every match, so SC2 starts without waiting for the
+# disk. The proxy always starts a new SC2, this only makes that start faster. Linux only.
+SC2_WARMUP = False
+SC2_WARMUP_PATHS = [SC2_BINARY, os.path.join(SC2_HOME, "SC2Data")]
 
 # MATCHES
 DISABLE_DEBUG = True
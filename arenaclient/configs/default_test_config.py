@@ -24,6 +24,8 @@ TEST_MODE = True
 CLEANUP_BETWEEN_ROUNDS = False
 SYSTEM = platform.system()
 SC2_PROXY = {"HOST": "127.0.0.1", "PORT": 8642}
+PARALLEL_MATCHES = 1
+PARALLEL_SLOT_OVERRIDES = {}
 RUN_LOCAL = True
 
 # Secure mode will ignore the BOTS_DIRECTORY config setting and instead run each bot in their home directory.
@@ -36,15 +38,32 @@ RUN_PLAYER2_AS_USER = None
 # LOGGING
 LOGGING_HANDLER = logging.FileHandler("supervisor.log", "a+")
 LOGGING_LEVEL = logging.DEBUG  # Set to 5 for trace logs
+LOG_VERBOSITY = 1  # Set to 2 to also log every file touched while installing bots
+LOG_FLUSH_INTERVAL = 1  # seconds between flushes of LOG_FILE
 
 # PATHS AND FILES
 TEMP_PATH = "/tmp/aiarena/"
 LOCAL_PATH = os.path.dirname(__file__)
 WORKING_DIRECTORY = LOCAL_PATH  # same for now
 LOG_FILE = os.path.join(WORKING_DIRECTORY, "client.log")
+# Log of the proxies of all match slots. Each result gets the part written since the previous result of its slot
+PROXY_LOG_FILE = os.path.join(WORKING_DIRECTORY, "proxy.log")
+PROXY_LOG_MAX_SIZE = 100 * 1024 ** 2  # bytes, the log is rotated to PROXY_LOG_FILE.1 beyond this
+PROCESS_REGISTRY_FILE = os.path.join(WORKING_DIRECTORY, "processes.json")
 REPLAYS_DIRECTORY = os.path.join(WORKING_DIRECTORY, "replays")
 BOTS_DIRECTORY = os.path.join(WORKING_DIRECTORY, "aiarena-test-bots")
 BOT_LOGS_DIRECTORY = os.path.join(WORKING_DIRECTORY, "logs")
+PREFETCH_NEXT_MATCH = False
+PREFETCH_DIRECTORY = os.path.join(WORKING_DIRECTORY, "prefetch")
+EXTRACT_THREADS = 4  # Threads used to extract bot zips
+MAX_EXTRACTED_SIZE = 16 * 1024 ** 3  # bytes, bot and bot data zips that extract to more are rejected
+MAX_EXTRACTED_MEMBERS = 200000  # bot and bot data zips with more files and folders are rejected
+RESULT_SPOOL_DIRECTORY = os.path.join(WORKING_DIRECTORY, "result_spool")
+CGROUP_ROOT = None
+SC2_CPU_AFFINITY = None
+PLAYER1_CPU_AFFINITY = None
+PLAYER2_CPU_AFFINITY = None
+AUTO_CPU_AFFINITY = False
 
 MATCH_SOURCE_CONFIG = FileMatchSource.FileMatchSourceConfig(
     matches_file=os.path.join(WORKING_DIRECTORY, "matches"),
@@ -61,8 +80,13 @@ MAX_GAME_TIME = 60486
 MAX_REAL_TIME = 7200  # 2 hours in seconds
 MAX_FRAME_TIME = 10
 STRIKES = 10
+BOT_EXIT_GRACE_TIME = 3  # seconds to wait for the result after a bot exited with an error before calling it a crash
+PROXY_STARTUP_TIMEOUT = 60  # seconds to wait for the proxy to report Connected and to acknowledge the config
+# Acknowledge every message of the proxy with "Received". Only disable this with a proxy that doesn't wait for it
+PROXY_MESSAGE_ACK = True
 REALTIME = False
 VISUALIZE = False
+SC2_WARMUP = False
 
 # MATCHES
 DISABLE_DEBUG = True
@@ -13,7 +13,7 @@ class AiArenaWebApi:
     API_MATCHES_ENDPOINT = "/api/arenaclient/matches/"
     API_RESULTS_ENDPOINT = "/api/arenaclient/results/"
 
-    def __init__(self, api_url, api_token, global_config):
+    def __init__(self, api_url, api_token, global_config, session: requests.Session = None):
         self.API_URL = api_url
         self.API_TOKEN = api_token
 
@@ -21,17 +21,18 @@ class AiArenaWebApi:
         self.API_RESULTS_URL = parse.urljoin(self.API_URL, AiArenaWebApi.API_RESULTS_ENDPOINT)
 
         self._utl = Utl(global_config)
+        self._session = session or requests.Session()
 
     def get_match(self):
         """
         Gets the next match in queue
         """
         try:
-            next_match_response = requests.post(
+            next_match_response = self._session.post(
                 self.API_MATCHES_URL,
                 headers={"Authorization": "Token " + self.API_TOKEN},
             )
-        except ConnectionError:
+        except requests.exceptions.RequestException:
             self._utl.printout(
                 f"ERROR: Failed to retrieve game. Connection to website failed. Sleeping."
             )
@@ -0,0 +1,88 @@
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from ..utl import Utl
+
+
+class ArtifactPackager:
+    """
+    Builds the zips uploaded with a result side by side, one thread per zip.
+
+    Files that are already compressed, like replays and zips a bot keeps in its data folder, are stored as they are
+    instead of being deflated a second time.
+    """
+
+    COMPRESSED_EXTENSIONS = {
+        ".sc2replay", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst", ".lz4",
+        ".npz", ".pt", ".pth", ".h5", ".onnx", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp4",
+    }
+    MAX_WORKERS = 5
+
+    def __init__(self, config):
+        self._config = config
+        self._utl = Utl(config)
+        self._executor = ThreadPoolExecutor(max_workers=ArtifactPackager.MAX_WORKERS,
+                                            thread_name_prefix="artifact_packaging")
+
+    @staticmethod
+    def _compress_type(path: str) -> int:
+        if os.path.splitext(path)[1].lower() in ArtifactPackager.COMPRESSED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    @staticmethod
+    def _replace(zip_path: str):
+        # Unlink instead of truncating, the old file may be hard linked into a cache
+        if os.path.lexists(zip_path):
+            os.remove(zip_path)
+
+    @staticmethod
+    def zip_files(zip_path: str, files: list):
+        """
+        Zip files, each under its own name.
+
+        :param zip_path:
+        :param files:
+        :return:
+        """
+        ArtifactPackager._replace(zip_path)
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            for path in files:
+                zip_file.write(path, os.path.basename(path), compress_type=ArtifactPackager._compress_type(path))
+
+    @staticmethod
+    def zip_directory(zip_path: str, directory: str):
+        """
+        Zip the contents of directory, like shutil.make_archive, but without changing the working directory.
+
+        :param zip_path:
+        :param directory:
+        :return:
+        """
+        ArtifactPackager._replace(zip_path)
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            for root, dirs, files in os.walk(directory):
+                for name in sorted(dirs):
+                    path = os.path.join(root, name)
+                    zip_file.write(path, os.path.relpath(path, directory))
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    zip_file.write(path, os.path.relpath(path, directory),
+                                   compress_type=ArtifactPackager._compress_type(path))
+
+    def package(self, archives: dict):
+        """
+        Build all archives at the same time and wait for them.
+
+        :param archives: zip path -> directory to zip, or list of files to zip
+        :return:
+        """
+        builds = [
+            self._executor.submit(
+                self.zip_directory if isinstance(source, str) else self.zip_files, zip_path, source
+            )
+            for zip_path, source in archives.items()
+        ]
+        for build in builds:
+            build.result()  # re-raises a failed build
@@ -1,11 +1,16 @@
-import hashlib
 import pathlib
 import stat
+import time
 
 from loguru import logger
 import os
-import zipfile
+from typing import Optional
+
 import requests
+from .bot_cache import BotCache
+from .bot_data_cache import BotDataCache
+from .zip_extractor import ZipExtractor
+from ..cgroups import MatchCgroups
 from ..utl import Utl
 import subprocess
 
@@ -40,12 +45,17 @@ class Bot:
         return bot_type_map[bot_type][0], bot_type_map[bot_type][1]
 
     def __init__(self, config, bot_id, name, game_display_id, bot_zip, bot_zip_md5hash, bot_data, bot_data_md5hash,
-                 plays_race, bot_type, bot_directory: str, run_as_user: str):
+                 plays_race, bot_type, bot_directory: str, run_as_user: str, bot_cache: Optional[BotCache] = None,
+                 session: Optional[requests.Session] = None, bot_data_cache: Optional[BotDataCache] = None):
         self._config = config
+        self._bot_cache = bot_cache
+        self._bot_data_cache = bot_data_cache
+        self._session = session
 
         self._logger = logger
 
         self._utl = Utl(self._config)
+        self._extractor = ZipExtractor(self._config)
 
         self.id = bot_id
         self.name = name
@@ -59,6 +69,10 @@ class Bot:
         self.run_as_user = run_as_user
         self.bot_directory: str = bot_directory
         self.bot_data_directory: str = os.path.join(bot_directory, 'data')
+        self.bot_zip_path: str = os.path.join(self._config.TEMP_PATH, name + ".zip")
+        self.bot_data_zip_path: str = os.path.join(self._config.TEMP_PATH, name + "-data.zip")
+        self.timings = {}  # seconds spent in the steps of installing the bot
+        self.bot_data_fingerprint: Optional[str] = None  # of the data folder once installed, with a bot data cache
 
     @property
     def bot_json(self):
@@ -79,53 +93,90 @@ class Bot:
         """
         Download the bot's folder and extracts it to a specified location.
 
+        :return: bool
+        """
+        return self.download_bot_files(self._config.TEMP_PATH) and self.install_bot_files()
+
+    def download_bot_files(self, download_directory):
+        """
+        Download the bot's zip and data zip to download_directory and check their MD5 hashes.
+        Nothing is extracted yet, so this can run while another match is using the bot directory.
+
+        :param download_directory:
+        :return: bool
+        """
+        self.bot_zip_path = os.path.join(download_directory, self.name + ".zip")
+        if self._bot_cache is None or not self._bot_cache.fetch_zip(self.bot_zip_md5hash, self.bot_zip_path):
+            self._utl.printout(f"Downloading bot {self.name}")
+            if not self._download_and_verify(self.bot_zip, self.bot_zip_md5hash, self.bot_zip_path):
+                return False
+            if self._bot_cache is not None:
+                self._bot_cache.store_zip(self.bot_zip_md5hash, self.bot_zip_path)
+
+        return self._download_bot_data(download_directory)
+
+    def _download_bot_data(self, download_directory):
+        """
+        Download the bot's data zip to download_directory, unless the bot data cache has it.
+
+        :param download_directory:
+        :return: bool
+        """
+        if self.bot_data is None:
+            return True
+        self.bot_data_zip_path = os.path.join(download_directory, self.name + "-data.zip")
+        if self._bot_data_cache is not None and self._bot_data_cache.fetch_zip(self.id, self.bot_data_md5hash,
+                                                                               self.bot_data_zip_path):
+            return True
+        self._utl.printout(f"Downloading bot data for {self.name}")
+        return self._download_and_verify(self.bot_data, self.bot_data_md5hash, self.bot_data_zip_path)
+
+    def install_bot_files(self):
+        """
+        Extract the downloaded bot zip and data zip to the bot directory.
+
         :return: bool
         """
         if self._config.CLEAN_BOT_DIRECTORIES_BEFORE_MATCH_START:
             self._utl.printout(f"Cleaning destination directory {self.bot_directory} for bot {self.name}")
             self._utl.clean_dir(self.bot_directory)
 
-        self._utl.printout(f"Downloading bot {self.name}")
-        # Download bot and save to .zip
-        r = requests.get(
-            self.bot_zip, headers={"Authorization": "Token " + self._config.MATCH_SOURCE_CONFIG.API_TOKEN}
-        )
-        bot_download_path = os.path.join(self._config.TEMP_PATH, self.name + ".zip")
-        with open(bot_download_path, "wb") as bot_zip:
-            bot_zip.write(r.content)
-        # Load bot from .zip to calculate md5
-        with open(bot_download_path, "rb") as bot_zip:
-            calculated_md5 = hashlib.md5(self._utl.file_as_bytes(bot_zip)).hexdigest()
-        if self.bot_zip_md5hash == calculated_md5:
-            self._utl.printout("MD5 hash matches transferred file...")
-            self._utl.printout(f"Extracting bot {self.name} to {self.bot_directory}")
-
-            # Extract to bot folder
-            with zipfile.ZipFile(bot_download_path, "r") as zip_ref:
-                zip_ref.extractall(self.bot_directory)
-
-            # if it's a linux bot, we need to add execute permissions
-            if self.type == "cpplinux":
-                # Chmod 770: rwxrwx---
-                os.chmod(
-                    os.path.join(self.bot_directory, self.name),
-                    stat.S_IRWXU | stat.S_IRWXG,  # | stat.S_IROTH,  - no public permissions
-                )
-
-            if self.get_bot_data_file():
-                pathlib.Path(self.bot_data_directory).mkdir(mode=0o770, exist_ok=True)
-                if self._config.SECURE_MODE:
-                    import pwd
-                    user = pwd.getpwnam(self.run_as_user)
-                    self._utl.set_secure_mode_permissions(user.pw_uid, user.pw_gid, self.bot_directory)
-                return True
-            else:
-                return False
-        else:
-            self._utl.printout(
-                f"MD5 hash ({self.bot_zip_md5hash}) does not match transferred file ({calculated_md5})"
+        self._utl.printout(f"Extracting bot {self.name} to {self.bot_directory}")
+        start = time.monotonic()
+
+        # Extract to bot folder
+        # Hard linked trees would hand the cached files over to the bot user in secure mode, so always extract there
+        if (self._bot_cache is None or not self._config.BOT_CACHE_EXTRACTED_TREES or self._config.SECURE_MODE
+                or not self._bot_cache.install_extracted(self.bot_zip_md5hash, self.bot_zip_path, self.bot_directory)):
+            self._extractor.extract(self.bot_zip_path, self.bot_directory)
+
+        # if it's a linux bot, we need to add execute permissions
+        if self.type == "cpplinux":
+            # May be hard linked to the bot cache, which must keep its own permissions
+            Utl.unshare_file(os.path.join(self.bot_directory, self.name))
+            # Chmod 770: rwxrwx---
+            os.chmod(
+                os.path.join(self.bot_directory, self.name),
+                stat.S_IRWXU | stat.S_IRWXG,  # | stat.S_IROTH,  - no public permissions
             )
-            return False
+
+        self.extract_bot_data_file()
+        self.timings["Extract"] = round(time.monotonic() - start, 3)
+        pathlib.Path(self.bot_data_directory).mkdir(mode=0o770, exist_ok=True)
+        if self._config.SECURE_MODE:
+            import pwd
+            user = pwd.getpwnam(self.run_as_user)
+            start = time.monotonic()
+            self._utl.set_secure_mode_permissions(user.pw_uid, user.pw_gid, self.bot_directory)
+            self.timings["Permissions"] = round(time.monotonic() - start, 3)
+            self._utl.printout(f"Secure mode permissions for {self.name} took {self.timings['Permissions']}s")
+
+        if self._bot_data_cache is not None:
+            self.bot_data_fingerprint = BotDataCache.fingerprint(self.bot_data_directory)
+            if self.bot_data is not None:
+                self._bot_data_cache.record_installed(self.id, self.bot_data_md5hash, self.bot_data_directory,
+                                                      self.bot_data_fingerprint)
+        return True
 
     # Get bot data
     def get_bot_data_file(self):
@@ -134,35 +185,81 @@ class Bot:
 
         :return: bool
         """
+        if not self._download_bot_data(self._config.TEMP_PATH):
+            return False
+        self.extract_bot_data_file()
+        return True
+
+    def extract_bot_data_file(self):
+        """
+        Extract the downloaded data zip to the bot's data directory.
+
+        :return:
+        """
         if self.bot_data is None:
+            return
+        if self._bot_data_cache is not None and self._bot_data_cache.is_installed(self.id, self.bot_data_md5hash,
+                                                                                  self.bot_data_directory):
+            self._utl.printout(f"Data for {self.name} in {self.bot_data_directory} is up to date")
+            return
+        self._utl.printout(f"Extracting data for {self.name} to {self.bot_data_directory}")
+        self._extractor.extract(self.bot_data_zip_path, self.bot_data_directory)
+
+    def bot_data_changed(self) -> bool:
+        """
+        Whether the bot changed its data folder since it was installed. Without a bot data cache this is always True,
+        so the data is uploaded after every match.
+
+        :return: bool
+        """
+        if self._bot_data_cache is None or self.bot_data_fingerprint is None:
             return True
-        self._utl.printout(f"Downloading bot data for {self.name}")
-        # Download bot data and save to .zip
-        r = requests.get(
-            self.bot_data, headers={"Authorization": "Token " + self._config.MATCH_SOURCE_CONFIG.API_TOKEN}
-        )
-        bot_data_path = os.path.join(self._config.TEMP_PATH, self.name + "-data.zip")
-        with open(bot_data_path, "wb") as bot_data_zip:
-            bot_data_zip.write(r.content)
-        with open(bot_data_path, "rb") as bot_data_zip:
-            calculated_md5 = hashlib.md5(self._utl.file_as_bytes(bot_data_zip)).hexdigest()
-        if self.bot_data_md5hash == calculated_md5:
+        return BotDataCache.fingerprint(self.bot_data_directory) != self.bot_data_fingerprint
+
+    def cache_bot_data(self, zip_path: str):
+        """
+        Add the data zip about to be uploaded to the bot data cache.
+
+        :param zip_path:
+        :return:
+        """
+        if self._bot_data_cache is not None:
+            self._bot_data_cache.store(self.id, zip_path, self.bot_data_directory,
+                                       BotDataCache.fingerprint(self.bot_data_directory))
+
+    def _download_and_verify(self, url, md5hash, path):
+        """
+        Stream url to path and check the MD5 hash calculated while downloading.
+
+        :param url:
+        :param md5hash:
+        :param path:
+        :return: bool
+        """
+        try:
+            calculated_md5 = self._utl.stream_download(
+                url, path, headers={"Authorization": "Token " + self._config.MATCH_SOURCE_CONFIG.API_TOKEN},
+                max_size=self._config.MAX_BOT_DOWNLOAD_SIZE, session=self._session,
+            )
+        except Exception as download_exception:
+            self._utl.printout(f"ERROR: Failed to download {url}. Error {download_exception}")
+            return False
+        if md5hash == calculated_md5:
             self._utl.printout("MD5 hash matches transferred file...")
-            self._utl.printout(f"Extracting data for {self.name} to {self.bot_data_directory}")
-            with zipfile.ZipFile(bot_data_path, "r") as zip_ref:
-                zip_ref.extractall(self.bot_data_directory)
             return True
         else:
             self._utl.printout(
-                f"MD5 hash ({self.bot_data_md5hash}) does not match transferred file ({calculated_md5})"
+                f"MD5 hash ({md5hash}) does not match transferred file ({calculated_md5})"
             )
             return False
 
-    def start_bot(self, opponent_id):
+    def start_bot(self, opponent_id, cgroup: Optional[str] = None, cpus: Optional[set] = None):
         """
         Start the bot with the correct arguments.
 
         :param opponent_id:
+        :param cgroup: path of the cgroup to run the bot in (Linux only)
+        :param cpus: CPUs to pin the bot to (Linux only)
         :return:
         """
         # todo: move to Bot class
@@ -233,11 +330,23 @@ class Bot:
                         os.umask(0o007)
                     return demote_function
 
+                def place(then):
+                    def place_function():
+                        # Join before privileges are dropped, the bot user can't write to the cgroup
+                        if cgroup is not None:
+                            MatchCgroups.join(cgroup)
+                        if cpus is not None:
+                            os.sched_setaffinity(0, cpus)
+                        then()
+                    return place_function
+
                 with open(os.path.join(self.bot_directory, "data", "stderr.log"), "w+") as out:
                     if self.run_as_user:
                         function = demote(self.run_as_user)
                     else:
                         function = os.setpgrp
+                    if cgroup is not None or cpus is not None:
+                        function = place(function)
                     process = subprocess.Popen(
                         " ".join(cmd_line),
                         stdout=out,
@@ -280,13 +389,15 @@ class BotFactory:
             return os.path.join(config.BOTS_DIRECTORY, bot_name), None
 
     @staticmethod
-    def from_api_data(config, data, player_number: int):
+    def from_api_data(config, data, player_number: int, bot_cache: Optional[BotCache] = None,
+                      session: Optional[requests.Session] = None, bot_data_cache: Optional[BotDataCache] = None):
         """
         Creates bot from api data
         """
         bot_directory, run_as_user = BotFactory.get_bot_directory_and_run_as_user(config, data["name"], player_number)
         return Bot(config, data["id"], data["name"], data["game_display_id"], data["bot_zip"], data["bot_zip_md5hash"],
-                   data["bot_data"], data["bot_data_md5hash"], data["plays_race"], data["type"], bot_directory, run_as_user)
+                   data["bot_data"], data["bot_data_md5hash"], data["plays_race"], data["type"], bot_directory, run_as_user,
+                   bot_cache, session, bot_data_cache)
 
     @staticmethod
     def from_values(config, bot_id, bot_name, bot_race, bot_type):
@@ -0,0 +1,179 @@
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from .zip_extractor import ZipExtractor
+from ..utl import Utl
+
+
+class BotCache:
+    """
+    Content addressed disk cache for bot zips, keyed by the bot_zip_md5hash the API sends with every match.
+
+    Layout:
+    <directory>/<md5>/bot.zip       the downloaded zip
+    <directory>/<md5>/extracted/    the extracted zip (only with BOT_CACHE_EXTRACTED_TREES)
+    <directory>/<md5>/size          bytes used by the entry, so eviction doesn't have to walk extracted trees
+
+    The modification time of the entry folder is used for LRU eviction.
+    """
+
+    ZIP_NAME = "bot.zip"
+    EXTRACTED_NAME = "extracted"
+    SIZE_NAME = "size"
+
+    def __init__(self, config):
+        self._config = config
+        self._utl = Utl(config)
+        self._extractor = ZipExtractor(config)
+        self.directory = config.BOT_CACHE_DIRECTORY
+        self.max_size = config.BOT_CACHE_MAX_SIZE
+
+    @staticmethod
+    def from_config(config) -> Optional["BotCache"]:
+        """
+        Returns a cache if BOT_CACHE_DIRECTORY is set, otherwise None.
+        """
+        if not config.BOT_CACHE_DIRECTORY:
+            return None
+        return BotCache(config)
+
+    def _entry_path(self, md5hash: str) -> str:
+        return os.path.join(self.directory, md5hash)
+
+    def fetch_zip(self, md5hash: str, destination: str) -> bool:
+        """
+        Link or copy a cached zip to destination.
+
+        :param md5hash:
+        :param destination:
+        :return: True on a cache hit
+        """
+        zip_path = os.path.join(self._entry_path(md5hash), BotCache.ZIP_NAME)
+        if not os.path.isfile(zip_path):
+            return False
+        try:
+            self._link_or_copy(zip_path, destination)
+        except OSError:
+            return False
+        self._touch(md5hash)
+        self._utl.printout(f"Bot cache hit for {md5hash}")
+        return True
+
+    def store_zip(self, md5hash: str, zip_path: str):
+        """
+        Add a verified zip to the cache.
+
+        :param md5hash:
+        :param zip_path:
+        :return:
+        """
+        entry_path = self._entry_path(md5hash)
+        try:
+            os.makedirs(entry_path, exist_ok=True)
+            # Copy under a unique name first so other slots never see a half written zip
+            tmp_path = os.path.join(entry_path, f".{uuid.uuid4().hex}.tmp")
+            shutil.copyfile(zip_path, tmp_path)
+            os.replace(tmp_path, os.path.join(entry_path, BotCache.ZIP_NAME))
+            self._update_size(md5hash)
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to add {md5hash} to the bot cache: {e}")
+            return
+        self.evict()
+
+    def install_extracted(self, md5hash: str, zip_path: str, destination: str) -> bool:
+        """
+        Populate destination from the cached extracted tree of a zip, extracting it into the cache first if needed.
+        Files are hard linked where possible, falling back to copies. The data folder is always copied, since the bot
+        data zip is extracted into it and the bot writes to it.
+
+        :param md5hash:
+        :param zip_path:
+        :param destination:
+        :return: False if the tree couldn't be provided and the caller should extract the zip itself
+        """
+        entry_path = self._entry_path(md5hash)
+        extracted_path = os.path.join(entry_path, BotCache.EXTRACTED_NAME)
+        try:
+            if not os.path.isdir(extracted_path):
+                tmp_path = os.path.join(entry_path, f".{uuid.uuid4().hex}.tmp")
+                self._extractor.extract(zip_path, tmp_path)
+                try:
+                    os.rename(tmp_path, extracted_path)
+                except OSError:
+                    # Another slot got there first
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                self._update_size(md5hash)
+                self.evict()
+
+            def install_file(src, dst):
+                BotCache._link_or_copy(src, dst, copy=BotCache._is_data(os.path.relpath(src, extracted_path)))
+
+            shutil.copytree(extracted_path, destination, copy_function=install_file, dirs_exist_ok=True)
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to use the extracted bot cache for {md5hash}: {e}")
+            return False
+        self._touch(md5hash)
+        return True
+
+    @staticmethod
+    def _is_data(relative_path: str) -> bool:
+        return relative_path.split(os.sep, 1)[0] == "data"
+
+    @staticmethod
+    def _link_or_copy(src, dst, copy=False):
+        # Replace files left over from a previous match, like extractall would
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if not copy:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+
+    def _touch(self, md5hash: str):
+        try:
+            os.utime(self._entry_path(md5hash))
+        except OSError:
+            pass
+
+    def _update_size(self, md5hash: str):
+        entry_path = self._entry_path(md5hash)
+        size = 0
+        for root, _, files in os.walk(entry_path):
+            for f in files:
+                try:
+                    size += os.lstat(os.path.join(root, f)).st_size
+                except OSError:
+                    pass
+        with open(os.path.join(entry_path, BotCache.SIZE_NAME), "w") as size_file:
+            size_file.write(str(size))
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in BOT_CACHE_MAX_SIZE.
+
+        :return:
+        """
+        entries = []
+        total_size = 0
+        for md5hash in os.listdir(self.directory):
+            entry_path = self._entry_path(md5hash)
+            try:
+                with open(os.path.join(entry_path, BotCache.SIZE_NAME), "r") as size_file:
+                    size = int(size_file.read())
+                last_used = os.stat(entry_path).st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append((last_used, md5hash, size))
+            total_size += size
+
+        for _, md5hash, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._utl.printout(f"Evicting {md5hash} from the bot cache")
+            shutil.rmtree(self._entry_path(md5hash), ignore_errors=True)
+            total_size -= size
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from ..utl import Utl
+
+
+class BotDataCache:
+    """
+    Disk cache of the last known data zip of every bot, keyed by bot ID and the bot_data_md5hash the API sends with
+    every match. Learning bots keep large data folders that rarely change between matches, so this lets the client skip
+    downloading, extracting, zipping and uploading data that is already known to be current.
+
+    Layout:
+    <directory>/<bot id>/data.zip      the last data zip downloaded from or uploaded to the website
+    <directory>/<bot id>/entry.json    its MD5 hash and the fingerprints of the data folders it was last installed to
+
+    The MD5 hash is always that of the zip as the website stores it, so a cached zip is only used when it is exactly the
+    file the API would have sent. The modification time of the entry folder is used for LRU eviction.
+    """
+
+    ZIP_NAME = "data.zip"
+    ENTRY_NAME = "entry.json"
+    IGNORED_FILES = {"stderr.log"}  # Written to the data folder by start_bot and uploaded separately
+
+    def __init__(self, config):
+        self._config = config
+        self._utl = Utl(config)
+        self.directory = config.BOT_DATA_CACHE_DIRECTORY
+        self.max_size = config.BOT_DATA_CACHE_MAX_SIZE
+
+    @staticmethod
+    def from_config(config) -> Optional["BotDataCache"]:
+        """
+        Returns a cache if BOT_DATA_CACHE_DIRECTORY is set, otherwise None.
+        """
+        if not config.BOT_DATA_CACHE_DIRECTORY:
+            return None
+        os.makedirs(config.BOT_DATA_CACHE_DIRECTORY, exist_ok=True)
+        return BotDataCache(config)
+
+    @staticmethod
+    def fingerprint(directory: str) -> str:
+        """
+        Fingerprint of the names, sizes and modification times of everything in a data folder. Any file a bot writes
+        changes it, without having to read the files back.
+
+        :param directory:
+        :return:
+        """
+        fingerprint = hashlib.sha1()
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(dirs + files):
+                path = os.path.join(root, name)
+                if root == directory and name in BotDataCache.IGNORED_FILES:
+                    continue
+                try:
+                    stat = os.lstat(path)
+                except OSError:
+                    continue
+                fingerprint.update(f"{os.path.relpath(path, directory)}\0{stat.st_mode}\0{stat.st_size}\0"
+                                   f"{stat.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+        return fingerprint.hexdigest()
+
+    def _entry_path(self, bot_id) -> str:
+        return os.path.join(self.directory, str(bot_id))
+
+    def _load_entry(self, bot_id) -> dict:
+        try:
+            with open(os.path.join(self._entry_path(bot_id), BotDataCache.ENTRY_NAME), "r") as entry_file:
+                return json.load(entry_file)
+        except (OSError, ValueError):
+            return {"md5": None, "installed": {}}
+
+    def _save_entry(self, bot_id, entry: dict):
+        Utl.atomic_write(os.path.join(self._entry_path(bot_id), BotDataCache.ENTRY_NAME),
+                         json.dumps(entry).encode("utf-8"))
+
+    def fetch_zip(self, bot_id, md5hash: str, destination: str) -> bool:
+        """
+        Link or copy the cached data zip of a bot to destination if it is the one with md5hash.
+
+        :param bot_id:
+        :param md5hash:
+        :param destination:
+        :return: True on a cache hit
+        """
+        if self._load_entry(bot_id)["md5"] != md5hash:
+            return False
+        try:
+            if os.path.lexists(destination):
+                os.remove(destination)
+            try:
+                os.link(os.path.join(self._entry_path(bot_id), BotDataCache.ZIP_NAME), destination)
+            except OSError:
+                shutil.copyfile(os.path.join(self._entry_path(bot_id), BotDataCache.ZIP_NAME), destination)
+        except OSError:
+            return False
+        self._touch(bot_id)
+        self._utl.printout(f"Bot data cache hit for bot {bot_id} ({md5hash})")
+        return True
+
+    def is_installed(self, bot_id, md5hash: str, directory: str) -> bool:
+        """
+        Whether directory still holds exactly what was in it when the data with md5hash was last installed there or
+        zipped from it.
+
+        :param bot_id:
+        :param md5hash:
+        :param directory:
+        :return:
+        """
+        entry = self._load_entry(bot_id)
+        installed = entry["installed"].get(os.path.abspath(directory))
+        return (entry["md5"] == md5hash and installed is not None and os.path.isdir(directory)
+                and installed == BotDataCache.fingerprint(directory))
+
+    def record_installed(self, bot_id, md5hash: str, directory: str, fingerprint: str):
+        """
+        Remember that directory holds the data with md5hash.
+
+        :param bot_id:
+        :param md5hash:
+        :param directory:
+        :param fingerprint:
+        :return:
+        """
+        entry = self._load_entry(bot_id)
+        if entry["md5"] != md5hash:
+            return
+        entry["installed"][os.path.abspath(directory)] = fingerprint
+        try:
+            self._save_entry(bot_id, entry)
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to update the bot data cache of bot {bot_id}: {e}")
+
+    def store(self, bot_id, zip_path: str, directory: Optional[str] = None, fingerprint: Optional[str] = None):
+        """
+        Make a data zip the cached data of a bot. Called with the zip that is about to be uploaded, so the next match
+        of the bot finds it under the MD5 hash the website will report for it.
+
+        :param bot_id:
+        :param zip_path:
+        :param directory: data folder the zip was made from
+        :param fingerprint: fingerprint of directory when the zip was made
+        :return:
+        """
+        entry_path = self._entry_path(bot_id)
+        md5 = hashlib.md5()
+        try:
+            os.makedirs(entry_path, exist_ok=True)
+            # Copy under a unique name first so other slots never see a half written zip
+            tmp_path = os.path.join(entry_path, f".{uuid.uuid4().hex}.tmp")
+            with open(zip_path, "rb") as src, open(tmp_path, "wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    md5.update(chunk)
+                    dst.write(chunk)
+            os.replace(tmp_path, os.path.join(entry_path, BotDataCache.ZIP_NAME))
+            entry = {"md5": md5.hexdigest(), "installed": {}}
+            if directory is not None and fingerprint is not None:
+                entry["installed"][os.path.abspath(directory)] = fingerprint
+            self._save_entry(bot_id, entry)
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to add the data of bot {bot_id} to the bot data cache: {e}")
+            return
+        self.evict()
+
+    def _touch(self, bot_id):
+        try:
+            os.utime(self._entry_path(bot_id))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in BOT_DATA_CACHE_MAX_SIZE.
+
+        :return:
+        """
+        entries = []
+        total_size = 0
+        for bot_id in os.listdir(self.directory):
+            entry_path = self._entry_path(bot_id)
+            try:
+                size = os.stat(os.path.join(entry_path, BotDataCache.ZIP_NAME)).st_size
+                last_used = os.stat(entry_path).st_mtime
+            except OSError:
+                continue
+            entries.append((last_used, bot_id, size))
+            total_size += size
+
+        for _, bot_id, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._utl.printout(f"Evicting the data of bot {bot_id} from the bot data cache")
+            shutil.rmtree(self._entry_path(bot_id), ignore_errors=True)
+            total_size -= size
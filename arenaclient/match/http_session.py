@@ -0,0 +1,151 @@
+import os
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ArenaSession(requests.Session):
+    """
+    requests session used for all AI Arena website traffic.
+    Connections are kept alive and pooled, and every request gets the configured timeout unless it sets its own.
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def build_session(config) -> ArenaSession:
+    """
+    Build a session from the HTTP_* config values.
+
+    Connection errors are retried for every request. Read errors and 5xx responses are only retried for idempotent
+    methods, so a match is never claimed or a result submitted twice by the retry policy.
+
+    :param config:
+    :return:
+    """
+    retry = Retry(
+        total=config.HTTP_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_SIZE, pool_maxsize=config.HTTP_POOL_SIZE,
+                          max_retries=retry)
+    session = ArenaSession(timeout=config.HTTP_TIMEOUT)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class MultipartFileStream:
+    """
+    multipart/form-data request body that is read from disk while it is being sent, so the files are never held
+    in memory. The length is known up front, so requests sends it with a Content-Length instead of chunked.
+
+    Use it as a context manager. Only the file currently being sent is open, and it is closed at the end of the
+    body, on seek (used by urllib3 to rewind before a retry) and when the context exits.
+    """
+
+    def __init__(self, fields: dict, files: dict):
+        """
+        :param fields: form field name -> value. Like requests, lists become repeated fields and None is left out
+        :param files: form field name -> path of the file to upload
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._parts = []  # bytes, or the path of a file to stream
+        for name, values in fields.items():
+            for value in values if isinstance(values, (list, tuple)) else [values]:
+                if value is not None:
+                    self._parts.append(self._part_header(name) + str(value).encode("utf-8") + b"\r\n")
+        for name, path in files.items():
+            self._parts.append(self._part_header(name, os.path.basename(path)))
+            self._parts.append(path)
+            self._parts.append(b"\r\n")
+        self._parts.append(f"--{self.boundary}--\r\n".encode("utf-8"))
+        self._length = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self._parts)
+
+        self._index = 0
+        self._offset = 0
+        self._position = 0
+        self._file = None
+
+    def _part_header(self, name: str, filename: str = None) -> bytes:
+        disposition = f'form-data; name="{self._quote(name)}"'
+        header = f"--{self.boundary}\r\n"
+        if filename is None:
+            header += f"Content-Disposition: {disposition}\r\n\r\n"
+        else:
+            header += (f'Content-Disposition: {disposition}; filename="{self._quote(filename)}"\r\n'
+                       f"Content-Type: application/octet-stream\r\n\r\n")
+        return header.encode("utf-8")
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(64 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length - self._position
+        chunks = []
+        while size > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                chunk = part[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                if self._offset >= len(part):
+                    self._index += 1
+                    self._offset = 0
+            else:
+                if self._file is None:
+                    self._file = open(part, "rb")
+                chunk = self._file.read(size)
+                if not chunk:
+                    self.close()
+                    self._index += 1
+                    continue
+            chunks.append(chunk)
+            size -= len(chunk)
+            self._position += len(chunk)
+        return b"".join(chunks)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if offset != 0 or whence != os.SEEK_SET:
+            raise OSError("MultipartFileStream can only be rewound to the start")
+        self.close()
+        self._index = 0
+        self._offset = 0
+        self._position = 0
+        return 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,69 @@
+import json
+import os
+
+import requests
+
+from ..utl import Utl
+
+
+class MapCache:
+    """
+    Keeps the maps in SC2_HOME/maps up to date without downloading maps that haven't changed.
+
+    The ETag and Last-Modified headers of every download are stored next to the map and sent back as
+    If-None-Match/If-Modified-Since, so the website answers unchanged maps with a 304 and no body.
+    Maps are written atomically, so SC2 never sees a half written map.
+    """
+
+    def __init__(self, config, session: requests.Session = None):
+        self._config = config
+        self._session = session or requests.Session()
+        self._utl = Utl(config)
+        self.directory = os.path.join(config.SC2_HOME, "maps")
+        self.hits = 0
+        self.misses = 0
+
+    def map_path(self, map_name: str) -> str:
+        return os.path.join(self.directory, f"{map_name}.SC2Map")
+
+    def _metadata_path(self, map_name: str) -> str:
+        return os.path.join(self.directory, f".{map_name}.SC2Map.json")
+
+    def _load_metadata(self, map_name: str) -> dict:
+        if not os.path.isfile(self.map_path(map_name)):
+            return {}
+        try:
+            with open(self._metadata_path(map_name), "r") as metadata_file:
+                return json.load(metadata_file)
+        except (OSError, ValueError):
+            return {}
+
+    def fetch(self, map_name: str, map_url: str) -> str:
+        """
+        Make sure the current version of a map is in the maps folder.
+
+        :param map_name:
+        :param map_url:
+        :return: path of the map
+        """
+        metadata = self._load_metadata(map_name)
+        headers = {}
+        if metadata.get("ETag"):
+            headers["If-None-Match"] = metadata["ETag"]
+        if metadata.get("Last-Modified"):
+            headers["If-Modified-Since"] = metadata["Last-Modified"]
+
+        r = self._session.get(map_url, headers=headers)
+        if r.status_code == 304:
+            self.hits += 1
+            self._utl.printout(f"Map {map_name} is up to date ({self.hits} hits, {self.misses} misses)")
+            return self.map_path(map_name)
+        if r.status_code >= 400:
+            raise Exception(f"Status code: {r.status_code}")
+
+        self.misses += 1
+        self._utl.printout(f"Downloaded map {map_name} ({self.hits} hits, {self.misses} misses)")
+        Utl.atomic_write(self.map_path(map_name), r.content)
+        metadata = {key: r.headers[key] for key in ("ETag", "Last-Modified") if r.headers.get(key)}
+        Utl.atomic_write(self._metadata_path(map_name), json.dumps(metadata).encode("utf-8"))
+        return self.map_path(map_name)
@@ -1,15 +1,22 @@
+import asyncio
+import inspect
 import json
 import os
 import shutil
 import time
-import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from enum import Enum
 from pathlib import Path
 from typing import Optional, Callable, Match
-import requests
 
 from ..match.aiarena_web_api import AiArenaWebApi
+from ..match.artifacts import ArtifactPackager
 from ..match.bot import Bot, BotFactory
+from ..match.bot_cache import BotCache
+from ..match.bot_data_cache import BotDataCache
+from ..match.http_session import build_session
+from ..match.map_cache import MapCache
+from ..match.result_queue import ResultUploadQueue
 from ..utl import Utl
 
 
@@ -24,6 +31,9 @@ class MatchSource:
     Abstract representation of a source of matches for the arena client to run.
     next_match must be implemented
     submit_result must be implemented
+
+    next_match, submit_result and close are coroutines and run on the client's event loop, so blocking work has to be
+    moved off the loop.
     """
 
     class MatchSourceConfig:
@@ -43,18 +53,26 @@ class MatchSource:
 
             self.map_name = map_name
 
+            self.timings = {}  # seconds spent preparing the match, by step
+
     def __init__(self, config: MatchSourceConfig):
         self._config = config
 
     def has_next(self) -> bool:
         raise NotImplementedError()
 
-    def next_match(self) -> Match:
+    async def next_match(self) -> Match:
         raise NotImplementedError()
 
-    def submit_result(self, match: Match, result):
+    async def submit_result(self, match: Match, result):
         raise NotImplementedError()
 
+    async def close(self):
+        """
+        Called once the client is done with the match source.
+        """
+        pass
+
 
 class HttpApiMatchSource(MatchSource):
     """
@@ -77,66 +95,179 @@ class HttpApiMatchSource(MatchSource):
 
     def __init__(self, config: HttpApiMatchSourceConfig, global_config):
         super().__init__(config)
-        self._api = AiArenaWebApi(config.API_URL, config.API_TOKEN, global_config)
+        self._session = build_session(global_config)
+        self._api = AiArenaWebApi(config.API_URL, config.API_TOKEN, global_config, self._session)
         self._config = global_config
         self._utl = Utl(global_config)
+        self._bot_cache = BotCache.from_config(global_config)
+        self._bot_data_cache = BotDataCache.from_config(global_config)
+        self._proxy_log_position = None  # what the previous result of this slot included of PROXY_LOG_FILE
+        self._map_cache = MapCache(global_config, self._session)
+        self._result_queue = ResultUploadQueue(global_config, self._session)
+        # The map and both bots are downloaded and installed side by side, see _submit_bot_steps
+        self._preparation_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="match_preparation")
+        self._packager = ArtifactPackager(global_config)
 
     def has_next(self) -> bool:
         return True  # always return true
 
-    def next_match(self) -> Optional[HttpApiMatch]:
+    async def next_match(self) -> Optional[HttpApiMatch]:
+        loop = asyncio.get_running_loop()
+        next_match_data = await loop.run_in_executor(None, self.claim_match)
+        if next_match_data is None:
+            await asyncio.sleep(30)
+            return None
+
+        await loop.run_in_executor(None, self.prepare_temp_directory)
+
+        match = await loop.run_in_executor(None, self.download_match, next_match_data, self._config.TEMP_PATH)
+        if match is None:
+            await asyncio.sleep(30)
+            return None
+
+        await loop.run_in_executor(None, self.install_match, match)
+        return match
+
+    def claim_match(self) -> Optional[dict]:
+        """
+        Ask the website for the next match. Blocking.
+        @return: the match data or None if there is no match to play
+        """
         next_match_data = self._api.get_match()
 
         if next_match_data is None:
-            time.sleep(30)
             return None
 
         if "id" not in next_match_data:
             self._utl.printout("No games available - sleeping")
-            time.sleep(30)
             return None
 
+        return next_match_data
+
+    def prepare_temp_directory(self):
+        """
+        Clean out the temp directory used by the previous match.
+        """
         self._utl.printout(f"Cleaning temp directory root {self._config.TEMP_ROOT}")
         self._utl.clean_dir(self._config.TEMP_ROOT)
         os.makedirs(self._config.TEMP_PATH, exist_ok=True)  # recreate aiarena temp folder
 
+    def download_match(self, next_match_data: dict, download_directory: str) -> Optional[HttpApiMatch]:
+        """
+        Download the map and both bots of a match. Blocking. Bots are downloaded to download_directory, the map is updated
+        atomically in the SC2 maps folder, so this is safe to run while another match is being played.
+        @param next_match_data:
+        @param download_directory:
+        @return: the match or None if a download failed
+        """
         next_match_id = next_match_data["id"]
         self._utl.printout(f"Next match: {next_match_id}")
-
-        # Download map
         map_name = next_match_data["map"]["name"]
         map_url = next_match_data["map"]["file"]
-        self._utl.printout(f"Downloading map {map_name}")
+        bot_1 = BotFactory.from_api_data(self._config, next_match_data["bot1"], 1, self._bot_cache,
+                                           self._session, self._bot_data_cache)
+        bot_2 = BotFactory.from_api_data(self._config, next_match_data["bot2"], 2, self._bot_cache,
+                                           self._session, self._bot_data_cache)
+
+        timings = {}
+        start = time.monotonic()
+        downloads = [
+            self._preparation_executor.submit(self._timed, timings, "MapDownload", self._download_map, map_name,
+                                              map_url),
+        ]
+        downloads += self._submit_bot_steps(
+            bot_1, bot_2,
+            (timings, "Bot1Download", bot_1.download_bot_files, download_directory),
+            (timings, "Bot2Download", bot_2.download_bot_files, download_directory),
+        )
+        succeeded = [download.result() for download in downloads]
+        timings["Download"] = round(time.monotonic() - start, 3)
+        self._utl.printout(f"Downloads took {timings}")
+        if not all(succeeded):
+            return None
+
+        match = HttpApiMatchSource.HttpApiMatch(next_match_id, bot_1, bot_2, map_name)
+        match.timings.update(timings)
+        return match
 
+    def _download_map(self, map_name: str, map_url: str) -> bool:
+        """
+        Download a map to the SC2 maps folder.
+        @param map_name:
+        @param map_url:
+        @return: bool
+        """
+        self._utl.printout(f"Downloading map {map_name}")
         try:
-            r = requests.get(map_url)
+            # Maps are replaced atomically, so this is safe while another match is running
+            self._map_cache.fetch(map_name, map_url)
         except Exception as download_exception:
             self._utl.printout(f"ERROR: Failed to download map {map_name} at URL {map_url}. Error {download_exception}")
-            time.sleep(30)
-            return None
-
-        map_path = os.path.join(self._config.SC2_HOME, "maps", f"{map_name}.SC2Map")
-        with open(map_path, "wb") as map_file:
-            map_file.write(r.content)
+            return False
+        return True
 
-        bot_1 = BotFactory.from_api_data(self._config, next_match_data["bot1"], 1)
-        if not bot_1.get_bot_file():
-            time.sleep(30)
-            return None
+    def install_match(self, match: HttpApiMatch):
+        """
+        Extract both bots of a downloaded match.
+        @param match:
+        """
+        start = time.monotonic()
+        installs = self._submit_bot_steps(match.bot1, match.bot2,
+                                          (match.timings, "Bot1Install", match.bot1.install_bot_files),
+                                          (match.timings, "Bot2Install", match.bot2.install_bot_files))
+        for install in installs:
+            install.result()  # re-raises a failed install
+        match.timings["Install"] = round(time.monotonic() - start, 3)
+        self._utl.printout(f"Installing the bots took {match.timings['Install']}s")
+
+    def _submit_bot_steps(self, bot1: Bot, bot2: Bot, bot1_step: tuple, bot2_step: tuple) -> list:
+        """
+        Run a step of each bot on the preparation executor, side by side unless both players are the same bot. Those
+        share the zip paths and, outside of secure mode, the bot directory, so the second player waits for the first.
+        @param bot1:
+        @param bot2:
+        @param bot1_step: arguments of _timed
+        @param bot2_step: arguments of _timed
+        @return: the futures of both steps
+        """
+        bot1_future = self._preparation_executor.submit(self._timed, *bot1_step)
+        if bot1.name != bot2.name:
+            return [bot1_future, self._preparation_executor.submit(self._timed, *bot2_step)]
+        return [bot1_future, self._preparation_executor.submit(self._timed_after, bot1_future, *bot2_step)]
 
-        bot_2 = BotFactory.from_api_data(self._config, next_match_data["bot2"], 2)
-        if not bot_2.get_bot_file():
-            time.sleep(30)
-            return None
+    @staticmethod
+    def _timed_after(previous: Future, *step):
+        """
+        Wait for previous to finish, successfully or not, then call _timed.
+        """
+        wait([previous])
+        return HttpApiMatchSource._timed(*step)
 
-        return HttpApiMatchSource.HttpApiMatch(next_match_id, bot_1, bot_2, map_name)
+    @staticmethod
+    def _timed(timings: dict, step: str, function: Callable, *args):
+        """
+        Call function and store the seconds it took in timings.
+        """
+        start = time.monotonic()
+        try:
+            return function(*args)
+        finally:
+            timings[step] = round(time.monotonic() - start, 3)
 
-    def submit_result(self, match: HttpApiMatch, result):
+    async def submit_result(self, match: HttpApiMatch, result):
         """
         Submit result.
         @param match:
         @param result:
         """
+        await asyncio.get_running_loop().run_in_executor(None, self._spool_result, match, result)
+
+    def _spool_result(self, match: HttpApiMatch, result):
+        """
+        Package the result artifacts and queue them for upload. Blocking.
+        @param match:
+        @param result:
+        """
         # quick hack to avoid these going uninitialized
         # todo: remove these and actually fix the issue
 
@@ -165,118 +296,145 @@ class HttpApiMatchSource(MatchSource):
         else:
             Path(bot2_error_log_tmp).touch()
 
-        zip_file = zipfile.ZipFile(
-            os.path.join(self._config.TEMP_PATH, match.bot1.name + "-error.zip"), "w"
-        )
-        zip_file.write(
-            os.path.join(self._config.TEMP_PATH, match.bot1.name + "-error.log"),
-            compress_type=zipfile.ZIP_DEFLATED,
-        )
-        zip_file.close()
-
-        zip_file = zipfile.ZipFile(
-            os.path.join(self._config.TEMP_PATH, match.bot2.name + "-error.zip"), "w"
-        )
-        zip_file.write(
-            os.path.join(self._config.TEMP_PATH, match.bot2.name + "-error.log"),
-            compress_type=zipfile.ZIP_DEFLATED,
-        )
-        zip_file.close()
-
         # client logs
         proxy_tmp = os.path.join(self._config.TEMP_PATH, "proxy.log")
         client_tmp = os.path.join(self._config.TEMP_PATH, "client.log")
 
-        if os.path.isfile("proxy.log"):
-            shutil.move("proxy.log", proxy_tmp)
-        else:
-            Path(proxy_tmp).touch()
-
-        if os.path.isfile(self._config.LOG_FILE):
-            shutil.move(self._config.LOG_FILE, client_tmp)
-        else:
-            Path(client_tmp).touch()
+        # The proxy log is shared by every slot and still open, so copy this slot's part instead of moving it
+        self._proxy_log_position = Utl.copy_log_since(self._config.PROXY_LOG_FILE, self._proxy_log_position,
+                                                      proxy_tmp)
 
-        arenaclient_log_zip = os.path.join(self._config.TEMP_PATH, "arenaclient_log.zip")
-        zip_file = zipfile.ZipFile(arenaclient_log_zip, "w")
-        zip_file.write(proxy_tmp, compress_type=zipfile.ZIP_DEFLATED)
-        # zip_file.write(supervisor_tmp, compress_type=zipfile.ZIP_DEFLATED)
-        zip_file.write(client_tmp, compress_type=zipfile.ZIP_DEFLATED)
-        zip_file.close()
+        # The log file is held open while logging, so let the logger move it
+        self._utl.move_log_file(client_tmp)
 
         # Create downloadable data archives
         if not os.path.isdir(match.bot1.bot_data_directory):
             os.makedirs(match.bot1.bot_data_directory, exist_ok=True)
-        shutil.make_archive(
-            os.path.join(self._config.TEMP_PATH, match.bot1.name + "-data"), "zip", match.bot1.bot_data_directory
-        )
         if not os.path.isdir(match.bot2.bot_data_directory):
             os.makedirs(match.bot2.bot_data_directory, exist_ok=True)
-        shutil.make_archive(
-            os.path.join(self._config.TEMP_PATH, match.bot2.name + "-data"), "zip", match.bot2.bot_data_directory
-        )
-        attempt_number = 1
-        while attempt_number < 60:
-            try:  # Upload replay file and bot data archives
-                self._utl.printout(
-                    f"Attempting to submit result. Attempt number: {attempt_number}."
-                )
-                file_list = {
-                    "bot1_data": open(
-                        os.path.join(self._config.TEMP_PATH, f"{match.bot1.name}-data.zip"), "rb"
-                    ),
-                    "bot2_data": open(
-                        os.path.join(self._config.TEMP_PATH, f"{match.bot2.name}-data.zip"), "rb"
-                    ),
-                    "bot1_log": open(
-                        os.path.join(self._config.TEMP_PATH, f"{match.bot1.name}-error.zip"), "rb"
-                    ),
-                    "bot2_log": open(
-                        os.path.join(self._config.TEMP_PATH, f"{match.bot2.name}-error.zip"), "rb"
-                    ),
-                    "arenaclient_log": open(arenaclient_log_zip, "rb"),
-                }
-
-                if os.path.isfile(replay_file_path):
-                    file_list["replay_file"] = open(replay_file_path, "rb")
-
-                payload = {"type": result.result, "match": int(match.id), "game_steps": result.game_time}
-
-                if result.bot1_avg_frame is not None:
-                    payload["bot1_avg_step_time"] = result.bot1_avg_frame
-                if result.bot2_avg_frame is not None:
-                    payload["bot2_avg_step_time"] = result.bot2_avg_frame
-
-                if result.bot1_tags is not None:
-                    payload["bot1_tags"] = result.bot1_tags
-
-                if result.bot2_tags is not None:
-                    payload["bot2_tags"] = result.bot2_tags
-
-                if self._config.DEBUG_MODE:
-                    self._utl.printout(json.dumps(payload))
-
-                post = requests.post(
-                    self._config.API_RESULTS_URL,
-                    files=file_list,
-                    data=payload,
-                    headers={"Authorization": "Token " + self._config.MATCH_SOURCE_CONFIG.API_TOKEN},
-                )
-                if post is None:
-                    self._utl.printout("ERROR: Result submission failed. 'post' was None.")
-                    attempt_number += 1
-                    time.sleep(60)
-                elif post.status_code >= 400:  # todo: retry?
-                    self._utl.printout(
-                        f"ERROR: Result submission failed. Status code: {post.status_code}."
-                    )
-                    attempt_number += 1
-                    time.sleep(60)
-                else:
-                    self._utl.printout(result.result + " - Result transferred")
-                    break
-            except ConnectionError:
-                self._utl.printout(f"ERROR: Result submission failed. Connection to website failed.")
+
+        file_list = {
+            "bot1_data": os.path.join(self._config.TEMP_PATH, f"{match.bot1.name}-data.zip"),
+            "bot2_data": os.path.join(self._config.TEMP_PATH, f"{match.bot2.name}-data.zip"),
+            "bot1_log": os.path.join(self._config.TEMP_PATH, f"{match.bot1.name}-error.zip"),
+            "bot2_log": os.path.join(self._config.TEMP_PATH, f"{match.bot2.name}-error.zip"),
+            "arenaclient_log": os.path.join(self._config.TEMP_PATH, "arenaclient_log.zip"),
+        }
+        archives = {
+            file_list["bot1_log"]: [bot1_error_log_tmp],
+            file_list["bot2_log"]: [bot2_error_log_tmp],
+            file_list["arenaclient_log"]: [proxy_tmp, client_tmp],
+        }
+        # Data the bot didn't touch is already on the website, so it isn't uploaded again
+        changed_data = {}
+        for field, bot in (("bot1_data", match.bot1), ("bot2_data", match.bot2)):
+            if bot.bot_data_changed():
+                changed_data[field] = bot
+                archives[file_list[field]] = bot.bot_data_directory
+            else:
+                self._utl.printout(f"Data of {bot.name} is unchanged, skipping its upload")
+                del file_list[field]
+
+        start = time.monotonic()
+        self._packager.package(archives)
+        result.timings["Packaging"] = round(time.monotonic() - start, 3)
+        self._utl.printout(f"Packaging the result took {result.timings['Packaging']}s")
+        for field, bot in changed_data.items():
+            bot.cache_bot_data(file_list[field])
+
+        if os.path.isfile(replay_file_path):
+            file_list["replay_file"] = replay_file_path
+
+        payload = {"type": result.result, "match": int(match.id), "game_steps": result.game_time}
+
+        if result.bot1_avg_frame is not None:
+            payload["bot1_avg_step_time"] = result.bot1_avg_frame
+        if result.bot2_avg_frame is not None:
+            payload["bot2_avg_step_time"] = result.bot2_avg_frame
+
+        if result.bot1_tags is not None:
+            payload["bot1_tags"] = result.bot1_tags
+
+        if result.bot2_tags is not None:
+            payload["bot2_tags"] = result.bot2_tags
+
+        payload["arenaclient_timings"] = json.dumps(result.timings_json())
+
+        if self._config.DEBUG_MODE:
+            self._utl.printout(json.dumps(payload))
+
+        # Uploaded in the background, so the next match doesn't have to wait for the website
+        self._result_queue.put(match.id, payload, file_list)
+
+    async def close(self):
+        self._utl.printout("Waiting for queued results to be uploaded")
+        await asyncio.get_running_loop().run_in_executor(None, self._result_queue.drain,
+                                                        self._config.RESULT_UPLOAD_DRAIN_TIMEOUT)
+
+
+class PrefetchingHttpApiMatchSource(HttpApiMatchSource):
+    """
+    Represents a source of matches originating from the AI Arena Website HTTP API that claims and downloads the next
+    match in the background while the current one is being played.
+    Downloads are staged in PREFETCH_DIRECTORY and only installed once the match is handed over.
+    """
+
+    def __init__(self, config: HttpApiMatchSource.HttpApiMatchSourceConfig, global_config):
+        super().__init__(config, global_config)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="match_prefetch")
+        self._prefetched_match: Optional[Future] = None
+        # Don't claim a match from the website that this client will never play
+        self._remaining_rounds = global_config.ROUNDS_PER_RUN
+
+    async def next_match(self) -> Optional[HttpApiMatchSource.HttpApiMatch]:
+        if self._prefetched_match is None:
+            self._prefetched_match = self._executor.submit(self._prefetch_match)
+        match = await asyncio.wrap_future(self._prefetched_match)
+        self._prefetched_match = None
+
+        if self._remaining_rounds > 0:
+            self._remaining_rounds -= 1
+
+        if match is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.prepare_temp_directory)
+            await loop.run_in_executor(None, self.install_match, match)
+
+        if self._remaining_rounds != 0:
+            self._prefetched_match = self._executor.submit(self._prefetch_match)
+
+        return match
+
+    async def close(self):
+        if self._prefetched_match is not None:
+            if not self._prefetched_match.cancel():
+                self._utl.printout("Waiting for the match being prefetched")
+                try:
+                    match = await asyncio.wrap_future(self._prefetched_match)
+                except Exception as e:
+                    self._utl.printout(f"ERROR: Prefetching the next match failed: {e}")
+                    match = None
+                if match is not None:
+                    self._utl.printout(f"WARNING: Match {match.id} was claimed but won't be played by this client")
+            self._prefetched_match = None
+        self._executor.shutdown()
+        await super().close()
+
+    def _prefetch_match(self) -> Optional[HttpApiMatchSource.HttpApiMatch]:
+        """
+        Claim the next match and download it to the prefetch directory. Runs on the prefetch thread.
+        """
+        next_match_data = self.claim_match()
+        if next_match_data is None:
+            time.sleep(30)  # not on the event loop
+            return None
+
+        os.makedirs(self._config.PREFETCH_DIRECTORY, exist_ok=True)
+        self._utl.clean_dir(self._config.PREFETCH_DIRECTORY)
+        match = self.download_match(next_match_data, self._config.PREFETCH_DIRECTORY)
+        if match is None:
+            time.sleep(30)
+        return match
 
 
 class FileMatchSource(MatchSource):
@@ -286,9 +444,19 @@ class FileMatchSource(MatchSource):
     Expected file format:
     Each match should be on it's own line, line so:
     Bot1Name,Bot1Race,Bot1Type,Bot2Name,Bot2Race[T,P,Z,R],Bot2Type,SC2MapName
+
+    Every line is played once. The byte offset of the next line is kept in a cursor file next to the matches file, so
+    the file is never rescanned and a restarted client carries on where it stopped. Lines can be appended while the
+    client is running. Starting with # escapes a line.
+
+    Results are appended to the results file as JSON lines, one result per line. The highest match ID is kept in a
+    small index file next to it, so neither submitting a result nor picking the next match ID reads the whole file.
+    Use export_results to convert the results file to the {"Results": [...]} format.
     """
 
     MATCH_FILE_VALUE_SEPARATOR = ','
+    RESULTS_INDEX_SUFFIX = ".index"
+    CURSOR_SUFFIX = ".cursor"
 
     class FileMatchSourceConfig(MatchSource.MatchSourceConfig):
         def __init__(self, matches_file, results_file):
@@ -296,6 +464,11 @@ class FileMatchSource(MatchSource):
             self.MATCHES_FILE = matches_file
             self.RESULTS_FILE = results_file
             self.results = []
+            # Results are only written once a match is finished, so remember the last ID handed out.
+            # This lives on the config so that every match slot sharing these files sees it.
+            self.last_match_id = 0
+            # Byte offset of the next line in the matches file, shared by all match slots the same way
+            self.cursor_offset = None
 
     class FileMatch(MatchSource.Match):
         """
@@ -326,37 +499,98 @@ class FileMatchSource(MatchSource):
         self._config = global_config
         self._matches_file = config.MATCHES_FILE
         self._results_file = config.RESULTS_FILE
+        self._results_index_file = config.RESULTS_FILE + FileMatchSource.RESULTS_INDEX_SUFFIX
+        self._cursor_file = config.MATCHES_FILE + FileMatchSource.CURSOR_SUFFIX
+        self._source_config = config
 
     def has_next(self) -> bool:
-        with open(self._matches_file, "r") as match_list:
-            for match_id, line in enumerate(match_list):
-                if line != '' and line[0] != '#':  # if the line isn't empty or escaped, we've got a match to play
-                    return True
-        return False
-    
+        line, _ = self._peek_next_line()
+        return line is not None
+
+    def _cursor_offset(self) -> int:
+        """
+        Offset of the next line to play. The stored cursor is only trusted if the line before it is still the line
+        that was played last, so a replaced matches file starts from the top again.
+        """
+        if self._source_config.cursor_offset is None:
+            offset = 0
+            try:
+                with open(self._cursor_file, "r") as cursor_file:
+                    cursor = json.load(cursor_file)
+                last_line = cursor["last_line"].encode("utf-8")
+                with open(self._matches_file, "rb") as match_list:
+                    match_list.seek(max(cursor["offset"] - len(last_line), 0))
+                    if match_list.read(len(last_line)) == last_line:
+                        offset = cursor["offset"]
+            except (OSError, ValueError, KeyError):
+                pass
+            self._source_config.cursor_offset = offset
+        return self._source_config.cursor_offset
+
+    def _peek_next_line(self) -> (Optional[str], int):
+        """
+        Find the next line to play, starting at the cursor.
+
+        :return: the line (or None if there is none) and the offset just after it
+        """
+        offset = self._cursor_offset()
+        with open(self._matches_file, "rb") as match_list:
+            match_list.seek(offset)
+            for raw_line in iter(match_list.readline, b""):
+                offset += len(raw_line)
+                line = raw_line.decode("utf-8")
+                if line.strip() != '' and line[0] != '#':  # if the line isn't empty or escaped, it's a match to play
+                    return line, offset
+        return None, offset
+
+    def _advance_cursor(self, line: str, offset: int):
+        self._source_config.cursor_offset = offset
+        cursor = {"offset": offset, "last_line": line}
+        Utl.atomic_write(self._cursor_file, json.dumps(cursor).encode("utf-8"))
+
     def get_next_match_id(self):
+        """
+        Highest match ID in the results file.
+        """
         try:
-            with open(self._results_file, "r+") as results_log:
-                results = json.loads(results_log.read())
-                result_list = results['Results']
-                return max([x.get('MatchID', 0) for x in result_list])
-        except:
+            size = os.path.getsize(self._results_file)
+        except OSError:
             return 0
-    
-    def next_match(self) -> FileMatch:
 
-        next_match = None
+        # The index is only trusted if the results file hasn't changed since it was written
+        try:
+            with open(self._results_index_file, "r") as index_file:
+                index = json.load(index_file)
+            if index["size"] == size:
+                return index["last_match_id"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        try:
+            last_match_id = max([x.get('MatchID', 0) for x in FileMatchSource.load_results(self._results_file)],
+                                default=0)
+        except (OSError, ValueError):
+            return 0
+        self._write_results_index(last_match_id)
+        return last_match_id
+
+    def _write_results_index(self, last_match_id):
+        index = {"last_match_id": last_match_id, "size": os.path.getsize(self._results_file)}
+        Utl.atomic_write(self._results_index_file, json.dumps(index).encode("utf-8"))
+    
+    async def next_match(self) -> Optional[FileMatch]:
+        line, offset = self._peek_next_line()
+        if line is None:
+            return None
 
-        with open(self._matches_file, "r") as match_list:
-            match_id = self.get_next_match_id() + 1
-            for _, line in enumerate(match_list):
-                if line != '' and line[0] != '#':  # if the line isn't empty or escaped, we've got a match to play
-                    next_match = self.FileMatch(self._config, match_id, line)
-                    break
+        # The cursor moves before the match is played, so a match interrupted by a crash isn't replayed
+        self._advance_cursor(line, offset)
 
-        return next_match
+        match_id = max(self.get_next_match_id(), self._source_config.last_match_id) + 1
+        self._source_config.last_match_id = match_id
+        return self.FileMatch(self._config, match_id, line)
 
-    def submit_result(self, match: FileMatch, result):
+    async def submit_result(self, match: FileMatch, result):
         # LOGS
         log_folder = os.path.join(self._config.BOT_LOGS_DIRECTORY)
         match_log_folder = os.path.join(log_folder, str(match.id))
@@ -391,37 +625,85 @@ class FileMatchSource(MatchSource):
         else:
             Path(bot2_error_log_tmp).touch()
 
-        self._ensure_results_file_exists()
+        self._convert_legacy_results_file()
+        last_match_id = max(self.get_next_match_id(), match.id)
 
-        with open(self._results_file) as results_log:
-            content = results_log.read()
-            results = json.loads(content)
+        # Don't glue the result to a line cut short by a crash
+        separator = ""
+        try:
+            with open(self._results_file, "rb") as results_log:
+                results_log.seek(-1, os.SEEK_END)
+                if results_log.read(1) != b"\n":
+                    separator = "\n"
+        except OSError:
+            pass  # no results yet
 
-        result_list = results['Results']
-        result_list.append(result.to_json())
-        json_object = dict({"Results": result_list})
+        with open(self._results_file, "a") as results_log:
+            results_log.write(separator + json.dumps(result.to_json()) + "\n")
 
-        with open(self._results_file, "w") as results_log:
-            json.dump(json_object, results_log)
+        self._write_results_index(last_match_id)
 
-        # remove the played match from the match list
-        # with open(self._matches_file, "r") as match_list:
-        #     lines = match_list.readlines()
+    @staticmethod
+    def _is_legacy_results_file(results_file) -> bool:
+        """
+        Checks if results_file is in the old {"Results": [...]} format.
+        """
+        try:
+            with open(results_file, "r") as results_log:
+                first_line = results_log.readline()
+            return "Results" in json.loads(first_line)
+        except (OSError, ValueError):
+            return False
+
+    def _convert_legacy_results_file(self):
+        if self._is_legacy_results_file(self._results_file):
+            results = FileMatchSource.load_results(self._results_file)
+            lines = "".join(json.dumps(x) + "\n" for x in results)
+            Utl.atomic_write(self._results_file, lines.encode("utf-8"))
 
-        # lines[match.id] = '# ' + lines[match.id]
+    @staticmethod
+    def load_results(results_file) -> list:
+        """
+        Read all results from a results file. Both the JSON lines and the old {"Results": [...]} format are supported.
+        JSON lines that can't be parsed are skipped.
 
-        # with open(self._matches_file, "w") as match_list:
-        #     match_list.writelines(lines)
+        :param results_file:
+        :return: list of results
+        """
+        if FileMatchSource._is_legacy_results_file(results_file):
+            with open(results_file, "r") as results_log:
+                return json.load(results_log)["Results"]
+
+        results = []
+        with open(results_file, "r") as results_log:
+            for line in results_log:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # empty, or cut short by a crash while it was appended
+                if isinstance(result, dict):
+                    results.append(result)
+        return results
 
-    def _ensure_results_file_exists(self):
-        if not os.path.exists(self._results_file):
-            with open(self._results_file, "w") as results_log:
-                json.dump({"Results": []}, results_log)  # create empty results file
+    @staticmethod
+    def export_results(results_file, export_file):
+        """
+        Write the results of results_file to export_file in the {"Results": [...]} format.
+
+        :param results_file:
+        :param export_file:
+        :return:
+        """
+        with open(export_file, "w") as export_log:
+            json.dump({"Results": FileMatchSource.load_results(results_file)}, export_log)
 
 
 class CustomMatchSource(MatchSource):
     """
     Represents a source of matches implemented by the user of the arena client
+
+    The callables can either be plain functions or coroutine functions. Plain next_match and submit_result functions
+    are run in the default executor.
     """
 
     class CustomMatchSourceConfig(MatchSource.MatchSourceConfig):
@@ -438,11 +720,24 @@ class CustomMatchSource(MatchSource):
     def has_next(self) -> bool:
         return self._config.has_next()
 
-    def next_match(self) -> Match:
-        return self._config.next_match()
+    async def next_match(self) -> Match:
+        return await self._call(self._config.next_match)
+
+    async def submit_result(self, match: Match, result):
+        return await self._call(self._config.submit_result, match, result)
+
+    @staticmethod
+    async def _call(function: Callable, *args):
+        """
+        Await a coroutine function, run anything else in the default executor so it can't block the event loop.
+        """
+        if inspect.iscoroutinefunction(function):
+            return await function(*args)
+        value = await asyncio.get_running_loop().run_in_executor(None, function, *args)
+        if inspect.isawaitable(value):  # e.g. a lambda returning a coroutine
+            return await value
+        return value
 
-    def submit_result(self, match: Match, result):
-        return self._config.submit_result(match, result)
 
 class MatchSourceFactory:
     """
@@ -454,6 +749,8 @@ class MatchSourceFactory:
         if config.MATCH_SOURCE_CONFIG.TYPE == MatchSourceType.FILE:
             return FileMatchSource(config, config.MATCH_SOURCE_CONFIG)
         elif config.MATCH_SOURCE_CONFIG.TYPE == MatchSourceType.HTTP_API:
+            if config.PREFETCH_NEXT_MATCH:
+                return PrefetchingHttpApiMatchSource(config.MATCH_SOURCE_CONFIG, config)
             return HttpApiMatchSource(config.MATCH_SOURCE_CONFIG, config)
         elif config.MATCH_SOURCE_CONFIG.TYPE == MatchSourceType.CUSTOM:
             return CustomMatchSource(config.MATCH_SOURCE_CONFIG, config)
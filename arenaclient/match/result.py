@@ -1,8 +1,21 @@
 import os
+import time
 from ..match.matches import MatchSource
 
 
 class Result:
+    # Phase of Client.main -> its name in the Match block of the timings. The proxy launches SC2 as the players
+    # connect, so SC2 launch time is part of Bot1Connect and Bot2Connect.
+    PHASE_TIMINGS = {
+        "Connect": "Connect",
+        "Config": "Config",
+        "LaunchBot1": "Bot1Connect",
+        "LaunchBot2": "Bot2Connect",
+        "Play": "Game",
+        "ReplayWait": "ReplayWait",
+        "Finalize": "Teardown",
+    }
+
     def __init__(self, match: MatchSource.Match, cfg):
         self.match_id = match.id
         self.bot1 = match.bot1.name
@@ -15,9 +28,15 @@ class Result:
         self.time_stamp = None
         self.bot1_avg_frame = 0
         self.bot2_avg_frame = 0
+        self.bot1_peak_memory = None
+        self.bot2_peak_memory = None
+        self.bot1_cpu_time = None
+        self.bot2_cpu_time = None
         self.bot1_tags = None
         self.bot2_tags = None
         self.replay_path = None
+        self.timings = {}  # seconds spent in the steps around the match, see timings_json
+        self.phases = {}  # phase of Client.main -> time it was entered, in seconds since the epoch
         self._config = cfg
     
     def __repr__(self):
@@ -27,6 +46,10 @@ class Result:
         GameTime={self.game_time}
         Bot1AvgStepTime={self.bot1_avg_frame}
         Bot2AvgStepTime={self.bot2_avg_frame}
+        Bot1PeakMemory={self.bot1_peak_memory}
+        Bot2PeakMemory={self.bot2_peak_memory}
+        Bot1CpuTime={self.bot1_cpu_time}
+        Bot2CpuTime={self.bot2_cpu_time}
         """
 
     def to_json(self):
@@ -45,10 +68,80 @@ class Result:
             "TimeStamp": self.time_stamp,
             "Bot1AvgFrame": self.bot1_avg_frame,
             "Bot2AvgFrame": self.bot2_avg_frame,
+            "Bot1PeakMemory": self.bot1_peak_memory,
+            "Bot2PeakMemory": self.bot2_peak_memory,
+            "Bot1CpuTime": self.bot1_cpu_time,
+            "Bot2CpuTime": self.bot2_cpu_time,
             'ReplayPath': self.replay_path,
             'Bot1Tags': self.bot1_tags,
-            'Bot2Tags': self.bot2_tags
+            'Bot2Tags': self.bot2_tags,
+            'Timings': self.timings_json(),
+            'Phases': self.phases,
+        }
+
+    def enter_phase(self, phase: str):
+        """
+        Record the time a phase of the match started.
+        """
+        self.phases[phase] = round(time.time(), 3)
+
+    def phase_durations(self) -> dict:
+        """
+        Seconds spent in every phase entered so far. The current phase counts until now, Done marks the end.
+        """
+        phases = [(phase, start) for phase, start in self.phases.items() if phase != "Done"]
+        ends = [start for _, start in list(self.phases.items())[1:]] + [time.time()]
+        return {phase: round(end - start, 3) for (phase, start), end in zip(phases, ends)}
+
+    def set_resource_usage(self, bot1_usage: dict, bot2_usage: dict):
+        """
+        Set the peak memory and CPU time of both bots. Set by player rather than by bot name, which both players
+        share in a mirror match.
+
+        :param bot1_usage: {"PeakMemory": bytes, "CpuTime": seconds}
+        :param bot2_usage: {"PeakMemory": bytes, "CpuTime": seconds}
+        """
+        self.bot1_peak_memory = bot1_usage.get("PeakMemory")
+        self.bot1_cpu_time = bot1_usage.get("CpuTime")
+        self.bot2_peak_memory = bot2_usage.get("PeakMemory")
+        self.bot2_cpu_time = bot2_usage.get("CpuTime")
+
+    def add_preparation_timings(self, match: MatchSource.Match):
+        """
+        Add the time spent downloading and installing the map and bots of match.
+        """
+        timings = match.timings
+        if "Download" in timings:
+            self.timings["Download"] = {
+                "Map": timings.get("MapDownload"),
+                "Bot1": timings.get("Bot1Download"),
+                "Bot2": timings.get("Bot2Download"),
+                "Total": timings["Download"],
+            }
+        if "Install" in timings:
+            self.timings["Install"] = {
+                "Bot1": dict(match.bot1.timings, Total=timings.get("Bot1Install")),
+                "Bot2": dict(match.bot2.timings, Total=timings.get("Bot2Install")),
+                "Total": timings["Install"],
+            }
+
+    def timings_json(self) -> dict:
+        """
+        Structured timings of the match, in seconds:
+        Download    map and bot downloads (AiArena only)
+        Install     extraction and secure mode permissions per bot (AiArena only)
+        Prepare     killing the previous match, creating cgroups and warming up SC2, and their Total
+        Match       phases of the match itself, from connecting to the proxy to the teardown, and their Total
+        Packaging   zipping the result artifacts (AiArena only)
+        ProxyMessages   message counts and handler times per proxy message type
+        """
+        match_timings = {
+            Result.PHASE_TIMINGS.get(phase, phase): duration for phase, duration in self.phase_durations().items()
         }
+        if self.phases:
+            end = self.phases.get("Done", time.time())
+            match_timings["Total"] = round(end - next(iter(self.phases.values())), 3)
+        return dict(self.timings, Match=match_timings)
 
     def has_result(self):
         """
@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import requests
+
+from .http_session import MultipartFileStream
+from ..utl import Utl
+
+
+class ResultUploadQueue:
+    """
+    Durable on disk queue of results waiting to be uploaded to the AI Arena website.
+
+    Every entry is a folder in RESULT_SPOOL_DIRECTORY holding the files to upload and an entry.json with the
+    payload. A background thread uploads the entries oldest first with exponential backoff and only removes an entry
+    once the website accepted it, so results survive website outages and client restarts.
+    Entries that still fail after RESULT_UPLOAD_MAX_ATTEMPTS, and entries the website rejects for good (any 4xx
+    response except 408 and 429), are moved to the failed sub folder.
+    """
+
+    ENTRY_FILE = "entry.json"
+    FAILED_DIRECTORY = "failed"
+    RETRYABLE_STATUS_CODES = {408, 429}  # client errors that may succeed later, like all server errors
+
+    def __init__(self, config, session: requests.Session):
+        self._config = config
+        self._session = session
+        self._utl = Utl(config)
+        self.directory = config.RESULT_SPOOL_DIRECTORY
+        self.failed_directory = os.path.join(self.directory, ResultUploadQueue.FAILED_DIRECTORY)
+        os.makedirs(self.failed_directory, exist_ok=True)
+
+        self._skipped = set()  # entries that failed for good but couldn't be moved out of the queue
+        self._wake_up = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="result_upload", daemon=True)
+        self._thread.start()
+
+    def put(self, match_id, payload: dict, files: dict):
+        """
+        Move the files of a result into the spool and queue it for upload.
+
+        :param match_id:
+        :param payload: form fields to post
+        :param files: form field name -> path of the file to upload
+        :return:
+        """
+        # Build the entry under a hidden name so the upload thread never sees half of it
+        tmp_directory = os.path.join(self.directory, f".{match_id}_{uuid.uuid4().hex}")
+        os.makedirs(tmp_directory)
+        entry_files = {}
+        for field, path in files.items():
+            file_name = field + os.path.splitext(path)[1]
+            shutil.move(path, os.path.join(tmp_directory, file_name))
+            entry_files[field] = file_name
+
+        entry = {"match_id": match_id, "payload": payload, "files": entry_files, "attempts": 0}
+        with open(os.path.join(tmp_directory, ResultUploadQueue.ENTRY_FILE), "w") as entry_file:
+            json.dump(entry, entry_file)
+
+        os.rename(tmp_directory, os.path.join(self.directory, f"{time.time_ns()}_{match_id}"))
+        self._utl.printout(f"Queued result of match {match_id} for upload")
+        self._wake_up.set()
+
+    def pending(self) -> list:
+        """
+        Entries waiting for upload, oldest first.
+        """
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if not name.startswith(".") and name != ResultUploadQueue.FAILED_DIRECTORY and name not in self._skipped
+        )
+
+    def drain(self, timeout: float = None):
+        """
+        Block until every queued result has been uploaded or has failed for good, or until timeout seconds have
+        passed. Results still queued then stay in the spool and are uploaded the next time the client starts.
+
+        :param timeout: None waits for as long as it takes
+        :return: the entries still queued
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending = self.pending()
+        while pending and (deadline is None or time.monotonic() < deadline):
+            self._wake_up.set()
+            time.sleep(1)
+            pending = self.pending()
+        if pending:
+            self._utl.printout(f"Gave up waiting for {len(pending)} queued results after {timeout}s, they stay in "
+                               f"{self.directory} until the next start: {', '.join(pending)}")
+        return pending
+
+    def _run(self):
+        delay = self._config.RESULT_UPLOAD_BACKOFF_INITIAL
+        while True:
+            pending = self.pending()
+            if not pending:
+                self._wake_up.wait()
+                self._wake_up.clear()
+                continue
+
+            entry_directory = os.path.join(self.directory, pending[0])
+            try:
+                uploaded = self._upload(entry_directory)
+            except Exception as e:
+                # A broken entry must not block the queue
+                self._utl.printout(f"ERROR: Failed to upload {entry_directory}: {e}. Moving it to {self.failed_directory}")
+                self._fail(entry_directory)
+                uploaded = True
+
+            if uploaded:
+                delay = self._config.RESULT_UPLOAD_BACKOFF_INITIAL
+            else:
+                time.sleep(delay)
+                delay = min(delay * 2, self._config.RESULT_UPLOAD_BACKOFF_MAX)
+
+    def _fail(self, entry_directory: str):
+        """
+        Move an entry to the failed folder. If that fails, the entry is renamed in place to a hidden name, and if
+        even that fails it is skipped until the client restarts, so the queue keeps moving either way.
+
+        :param entry_directory:
+        :return:
+        """
+        name = os.path.basename(entry_directory)
+        try:
+            shutil.move(entry_directory, self.failed_directory)
+            return
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to move {entry_directory} to {self.failed_directory}: {e}")
+        try:
+            os.rename(entry_directory, os.path.join(self.directory, f".failed_{name}"))
+            self._utl.printout(f"Renamed it to .failed_{name} instead")
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to rename {entry_directory}: {e}. Skipping it until the next start")
+            self._skipped.add(name)
+
+    def _upload(self, entry_directory: str) -> bool:
+        """
+        Upload one entry.
+
+        :param entry_directory:
+        :return: False if the upload should be retried
+        """
+        entry_path = os.path.join(entry_directory, ResultUploadQueue.ENTRY_FILE)
+        with open(entry_path, "r") as entry_file:
+            entry = json.load(entry_file)
+        entry["attempts"] += 1
+        match_id = entry["match_id"]
+
+        start = time.monotonic()
+        try:
+            self._utl.printout(f"Attempting to submit result of match {match_id}. Attempt number: {entry['attempts']}.")
+            files = {field: os.path.join(entry_directory, file_name) for field, file_name in entry["files"].items()}
+            # Streamed from disk, so large bot data zips are never loaded into memory
+            with MultipartFileStream(entry["payload"], files) as body:
+                post = self._session.post(
+                    self._config.API_RESULTS_URL,
+                    data=body,
+                    headers={
+                        "Authorization": "Token " + self._config.MATCH_SOURCE_CONFIG.API_TOKEN,
+                        "Content-Type": body.content_type,
+                    },
+                )
+            if 400 <= post.status_code < 500 and post.status_code not in ResultUploadQueue.RETRYABLE_STATUS_CODES:
+                # Sending the same result again won't change the answer, so don't hold up the queue with it
+                self._utl.printout(f"ERROR: Result submission of match {match_id} was rejected. "
+                                   f"Status code: {post.status_code}. Response: {post.text[:1000]}. "
+                                   f"It has been moved to {self.failed_directory}")
+                self._fail(entry_directory)
+                return True
+            if post.status_code >= 400:
+                self._utl.printout(f"ERROR: Result submission failed. Status code: {post.status_code}.")
+            else:
+                self._utl.printout(f"{entry['payload']['type']} - Result transferred "
+                                   f"in {time.monotonic() - start:.3f}s")
+                shutil.rmtree(entry_directory, ignore_errors=True)
+                return True
+        except requests.exceptions.RequestException:
+            self._utl.printout("ERROR: Result submission failed. Connection to website failed.")
+
+        if entry["attempts"] >= self._config.RESULT_UPLOAD_MAX_ATTEMPTS:
+            self._utl.printout(f"ERROR: Giving up on the result of match {match_id}. "
+                               f"It has been moved to {self.failed_directory}")
+            self._fail(entry_directory)
+            return True
+
+        Utl.atomic_write(entry_path, json.dumps(entry).encode("utf-8"))
+        return False
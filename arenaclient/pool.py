@@ -0,0 +1,87 @@
+import asyncio
+import os
+
+from .affinity import plan_cpu_affinity
+from .client import Client
+
+
+class SlotConfig:
+    """
+    Wraps the global config and overrides the values that have to be unique for every match slot.
+    Everything that isn't overridden is read from the wrapped config.
+    """
+
+    def __init__(self, config, slot_id: int, overrides: dict):
+        self._base_config = config
+        self.SLOT_ID = slot_id
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, item):
+        return getattr(self._base_config, item)
+
+
+def build_slot_configs(config) -> list:
+    """
+    Creates one config per match slot. Every slot gets its own proxy port and its own temp, replay and
+    bot directories so matches can run side by side.
+
+    :param config:
+    :return:
+    """
+    slot_count = config.PARALLEL_MATCHES
+    slot_overrides = config.PARALLEL_SLOT_OVERRIDES
+    if slot_count <= 1:
+        overrides = dict(plan_cpu_affinity(1)[0]) if config.AUTO_CPU_AFFINITY else {}
+        overrides.update(slot_overrides.get(0, {}))
+        return [SlotConfig(config, 0, overrides)]
+
+    cpu_affinity = plan_cpu_affinity(slot_count) if config.AUTO_CPU_AFFINITY else [{}] * slot_count
+    slot_configs = []
+    for slot_id in range(slot_count):
+        slot_name = f"slot_{slot_id}"
+        temp_path = os.path.join(config.TEMP_PATH, slot_name)
+        overrides = {
+            "SC2_PROXY": {"HOST": config.SC2_PROXY["HOST"], "PORT": config.SC2_PROXY["PORT"] + slot_id},
+            # The HTTP API match source wipes TEMP_ROOT before every match, so keep it inside the slot
+            "TEMP_ROOT": temp_path,
+            "TEMP_PATH": temp_path,
+            "REPLAYS_DIRECTORY": os.path.join(config.REPLAYS_DIRECTORY, slot_name),
+            "LOG_FILE": f"{os.path.splitext(config.LOG_FILE)[0]}_{slot_name}.log",
+            "PROCESS_REGISTRY_FILE": f"{os.path.splitext(config.PROCESS_REGISTRY_FILE)[0]}_{slot_name}.json",
+            "PREFETCH_DIRECTORY": os.path.join(config.PREFETCH_DIRECTORY, slot_name),
+            "RESULT_SPOOL_DIRECTORY": os.path.join(config.RESULT_SPOOL_DIRECTORY, slot_name),
+        }
+        if not config.RUN_LOCAL:
+            # Local bots are already in place, downloaded bots need their own folder
+            overrides["BOTS_DIRECTORY"] = os.path.join(config.BOTS_DIRECTORY, slot_name)
+        overrides.update(cpu_affinity[slot_id])
+        overrides.update(slot_overrides.get(slot_id, {}))
+        slot_configs.append(SlotConfig(config, slot_id, overrides))
+
+    if config.SECURE_MODE:
+        # Secure mode runs bots in the home directory of their user, so slots can't share users
+        users = [(c.RUN_PLAYER1_AS_USER, c.RUN_PLAYER2_AS_USER) for c in slot_configs]
+        flat_users = [user for pair in users for user in pair]
+        if len(set(flat_users)) != len(flat_users):
+            raise Exception("SECURE_MODE with PARALLEL_MATCHES > 1 requires unique RUN_PLAYER1_AS_USER and "
+                            "RUN_PLAYER2_AS_USER values for every slot in PARALLEL_SLOT_OVERRIDES!")
+
+    return slot_configs
+
+
+class ClientPool:
+    """
+    Runs one arena client per match slot on the same event loop.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        self.slot_configs = build_slot_configs(config)
+        self.clients = [Client(slot_config) for slot_config in self.slot_configs]
+
+    async def run(self):
+        """
+        Run all slots until each of them has finished.
+        @return:
+        """
+        await asyncio.gather(*(client.run() for client in self.clients))
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import signal
+
+import psutil
+
+from .utl import Utl
+
+
+class ProcessRegistry:
+    """
+    Keeps track of the processes started for the matches of one client (bots and SC2), so they can be killed by PID
+    or process group without scanning the process table.
+
+    The registry is mirrored to PROCESS_REGISTRY_FILE, which lets a restarted client reap whatever a crashed run left
+    behind. Every entry stores the process creation time, so a PID that has since been reused is never killed.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        self._utl = Utl(config)
+        self._registry_file = config.PROCESS_REGISTRY_FILE
+        self._processes = {}  # pid -> {"name", "pgid", "create_time"}
+
+    def register(self, pid: int, name: str, pgid: int = None):
+        """
+        Track a process.
+
+        :param pid:
+        :param name: shown in the logs
+        :param pgid: process group to kill along with the process, if it leads its own group
+        :return:
+        """
+        try:
+            create_time = psutil.Process(pid).create_time()
+        except psutil.Error:
+            return  # already gone
+        self._processes[pid] = {"name": name, "pgid": pgid, "create_time": create_time}
+        self._save()
+
+    def is_tracking(self, name: str) -> bool:
+        """
+        Checks if a process with this name is tracked.
+
+        :param name:
+        :return:
+        """
+        return any(entry["name"] == name for entry in self._processes.values())
+
+    def is_running(self, pid: int) -> bool:
+        """
+        Checks if a tracked process is still the process that was registered.
+
+        :param pid:
+        :return:
+        """
+        entry = self._processes.get(pid)
+        if entry is None:
+            return psutil.pid_exists(pid)
+        return self._is_same_process(pid, entry)
+
+    @staticmethod
+    def _is_same_process(pid: int, entry: dict) -> bool:
+        try:
+            return psutil.Process(pid).create_time() == entry["create_time"]
+        except psutil.Error:
+            return False
+
+    def kill(self, pids: list, sig=signal.SIGTERM):
+        """
+        Kill the given tracked processes and their process groups.
+
+        :param pids:
+        :param sig:
+        :return:
+        """
+        for pid in pids:
+            entry = self._processes.pop(pid, None)
+            if entry is None:
+                continue
+            self._kill_entry(pid, entry, sig)
+        self._save()
+
+    def kill_all(self, sig=signal.SIGTERM):
+        """
+        Kill every tracked process.
+
+        :param sig:
+        :return:
+        """
+        self.kill(list(self._processes.keys()), sig)
+
+    def _kill_entry(self, pid: int, entry: dict, sig):
+        self._utl.printout(f"Killing {entry['name']} (PID {pid})")
+        try:
+            if entry["pgid"] is not None and hasattr(os, "killpg"):
+                # The group outlives its leader, so kill it even if the leader is gone
+                os.killpg(entry["pgid"], sig)
+            elif self._is_same_process(pid, entry):
+                os.kill(pid, sig)
+        except (ProcessLookupError, PermissionError):
+            self._utl.printout(f"Already closed: {pid}")
+
+    def reap_stale(self, sig=signal.SIGTERM):
+        """
+        Kill the processes a previous run of this client left behind.
+
+        :param sig:
+        :return:
+        """
+        try:
+            with open(self._registry_file, "r") as registry_file:
+                stale = {int(pid): entry for pid, entry in json.load(registry_file).items()}
+        except (OSError, ValueError):
+            return
+
+        for pid, entry in stale.items():
+            # The previous run can't vouch for its process groups any more, so only kill verified leaders
+            if self._is_same_process(pid, entry):
+                self._kill_entry(pid, entry, sig)
+        self._save()
+
+    def _save(self):
+        try:
+            Utl.atomic_write(self._registry_file, json.dumps(self._processes).encode("utf-8"))
+        except OSError as e:
+            self._utl.printout(f"ERROR: Failed to write {self._registry_file}: {e}")
+
+
+class SC2Locator:
+    """
+    Finds the SC2 processes the proxy of one match slot launched.
+
+    The proxies of all slots run inside the arena client, so every SC2 is a child of the arena client, and each proxy
+    picks the port of its SC2 itself. Neither tells the slots apart. Instead, with PARALLEL_MATCHES > 1 slots take
+    turns starting their matches: from connecting to the proxy until both bots have connected, a slot holds a lock
+    shared by all slots. The proxy launches SC2 for the players as they connect, so any SC2 that appears while a slot
+    holds the lock belongs to it. With a single slot every new SC2 belongs to it, so no lock is taken.
+    """
+
+    _startup_lock = None  # shared by the slots, created on first use so it belongs to the running event loop
+    FIND_TIMEOUT = 10  # seconds to wait for SC2 to show up after the bots connected
+    POLL_INTERVAL = 0.1  # seconds
+
+    def __init__(self, config):
+        self._config = config
+        self._utl = Utl(config)
+        self._before = None
+        self._holding = False
+        self._locked = False
+
+    @staticmethod
+    def sc2_processes() -> dict:
+        """
+        SC2 processes started by the arena client.
+
+        :return: PID -> psutil.Process
+        """
+        processes = {}
+        try:
+            for process in psutil.Process().children(recursive=True):
+                try:
+                    if process.name().startswith("SC2"):
+                        processes[process.pid] = process
+                except psutil.Error:
+                    pass  # exited
+        except psutil.Error:
+            pass
+        return processes
+
+    async def begin_startup(self):
+        """
+        Wait for the other slots to finish starting their matches and remember which SC2 processes already exist.
+
+        :return:
+        """
+        if self._config.PARALLEL_MATCHES > 1:
+            if SC2Locator._startup_lock is None:
+                SC2Locator._startup_lock = asyncio.Lock()
+            await SC2Locator._startup_lock.acquire()
+            self._locked = True
+        self._holding = True
+        self._before = set(SC2Locator.sc2_processes())
+
+    @property
+    def holding(self) -> bool:
+        """
+        Whether this slot is still starting its match.
+        """
+        return self._holding
+
+    def launched(self) -> list:
+        """
+        The SC2 processes launched since begin_startup so far.
+
+        :return: list of psutil.Process
+        """
+        return [process for pid, process in SC2Locator.sc2_processes().items() if pid not in self._before]
+
+    async def find(self) -> list:
+        """
+        The SC2 processes launched since begin_startup. Waits up to FIND_TIMEOUT seconds for the first one.
+
+        :return: list of psutil.Process
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SC2Locator.FIND_TIMEOUT
+        while True:
+            found = self.launched()
+            if found or loop.time() >= deadline:
+                break
+            await asyncio.sleep(SC2Locator.POLL_INTERVAL)
+        if not found:
+            self._utl.printout("WARNING: Couldn't find the SC2 process of this match")
+        return found
+
+    def end_startup(self):
+        """
+        Let the next slot start its match. Safe to call when the startup already ended.
+
+        :return:
+        """
+        self._holding = False
+        if self._locked:
+            self._locked = False
+            SC2Locator._startup_lock.release()
@@ -0,0 +1,89 @@
+import json
+import time
+from typing import Awaitable, Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """
+    Decode a JSON message from the proxy, with orjson if it is installed.
+
+    :param data: str or bytes
+    :return:
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class ProxyMessageDispatcher:
+    """
+    Routes the JSON messages the proxy sends during a match to handlers, by the keys they contain.
+
+    Handlers are checked in the order they were registered, and a message containing several keys of the same handler
+    is handed to it once. Every message is counted under the first key that has a handler ("Unknown" if none has), and
+    the time its handlers took is added to that type.
+    """
+
+    UNKNOWN = "Unknown"
+
+    def __init__(self):
+        self._handlers = {}  # key -> handler, in registration order
+        self._stats = {}  # message type -> {"Count", "HandlerTime", "MaxHandlerTime"}
+
+    def register(self, keys, handler: Callable[[dict], Awaitable]):
+        """
+        Call handler with every message that contains one of keys.
+
+        :param keys: a key or a tuple of keys
+        :param handler: coroutine function taking the decoded message
+        :return:
+        """
+        for key in (keys,) if isinstance(keys, str) else keys:
+            self._handlers[key] = handler
+
+    async def dispatch(self, msg: dict):
+        """
+        Hand a decoded message to its handlers.
+
+        :param msg:
+        :return:
+        """
+        start = time.perf_counter()
+        message_type = None
+        called = []
+        for key, handler in self._handlers.items():
+            if key not in msg or handler in called:
+                continue
+            if message_type is None:
+                message_type = key
+            called.append(handler)
+            await handler(msg)
+        self._count(message_type or ProxyMessageDispatcher.UNKNOWN, time.perf_counter() - start)
+
+    def _count(self, message_type: str, seconds: float):
+        stats = self._stats.get(message_type)
+        if stats is None:
+            stats = self._stats[message_type] = {"Count": 0, "HandlerTime": 0.0, "MaxHandlerTime": 0.0}
+        stats["Count"] += 1
+        stats["HandlerTime"] += seconds
+        stats["MaxHandlerTime"] = max(stats["MaxHandlerTime"], seconds)
+
+    def stats(self) -> dict:
+        """
+        Number of messages and seconds spent in their handlers, per message type.
+
+        :return: {message type: {"Count": int, "HandlerTime": seconds, "MaxHandlerTime": seconds}}
+        """
+        return {
+            message_type: {
+                "Count": stats["Count"],
+                "HandlerTime": round(stats["HandlerTime"], 6),
+                "MaxHandlerTime": round(stats["MaxHandlerTime"], 6),
+            }
+            for message_type, stats in self._stats.items()
+        }
@@ -0,0 +1,70 @@
+import os
+import time
+
+from .utl import Utl
+
+
+class SC2Warmup:
+    """
+    Asks the kernel to read the files SC2 boots from into the page cache before the proxy starts SC2, so a match
+    doesn't have to wait for SC2 to load them from disk after bots or an earlier match pushed them out of memory.
+
+    The kernel reads the files in the background (posix_fadvise with POSIX_FADV_WILLNEED), so warming up only takes
+    as long as it takes to walk SC2_WARMUP_PATHS.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        self._utl = Utl(config)
+        self.paths = config.SC2_WARMUP_PATHS
+
+    @staticmethod
+    def from_config(config):
+        """
+        Creates the warm up if SC2_WARMUP is enabled.
+
+        :param config:
+        :return: SC2Warmup or None
+        """
+        if not config.SC2_WARMUP:
+            return None
+        if not hasattr(os, "posix_fadvise"):
+            raise Exception("SC2_WARMUP needs posix_fadvise, which isn't available on this platform!")
+        return SC2Warmup(config)
+
+    def _files(self, map_name: str = None):
+        paths = list(self.paths)
+        if map_name is not None:
+            paths.append(os.path.join(self._config.SC2_HOME, "maps", f"{map_name}.SC2Map"))
+        for path in paths:
+            if os.path.isfile(path):
+                yield path
+            for root, _, files in os.walk(path):
+                for file in files:
+                    yield os.path.join(root, file)
+
+    def warm(self, map_name: str = None):
+        """
+        Start reading the SC2 files and the map of the next match into the page cache.
+
+        :param map_name:
+        :return:
+        """
+        start = time.monotonic()
+        file_count = 0
+        size = 0
+        for path in self._files(map_name):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                size += os.fstat(fd).st_size
+                file_count += 1
+            except OSError as e:
+                self._utl.printout(f"ERROR: Failed to warm up {path}: {e}")
+            finally:
+                os.close(fd)
+        self._utl.printout(f"Warming up {file_count} SC2 files ({size / 1024 ** 2:.0f} MiB), "
+                           f"took {time.monotonic() - start:.2f}s")
@@ -1,4 +1,3 @@
-import json
 import os
 import asyncio
 import shutil
@@ -6,7 +5,7 @@ import logging
 from arenaclient.configs import default_test_config as config
 
 from arenaclient.client import Client
-from arenaclient.match.matches import MatchSourceType
+from arenaclient.match.matches import MatchSourceType, FileMatchSource
 from arenaclient.utl import Utl
 from pathlib import Path
 
@@ -57,26 +56,29 @@ class IntegrationTest:
                 await ac.run()
 
                 try:
-                    with open(config.MATCH_SOURCE_CONFIG.RESULTS_FILE, "r") as f:
-                        result = json.load(f)
-                    test_result = f"Result ({str(result['Results'][0]['Result'])}) " \
+                    result = FileMatchSource.load_results(config.MATCH_SOURCE_CONFIG.RESULTS_FILE)
+                    test_result = f"Result ({str(result[0]['Result'])}) " \
                                   f"matches expected result ({value}):" + \
-                                  str(result["Results"][0]["Result"] == value)
+                                  str(result[0]["Result"] == value)
                     self.utl.printout(test_result)
-                    assert (str(result['Results'][0]['Result']) == value)
+                    assert (str(result[0]['Result']) == value)
                     with open('test_results.txt', 'a+') as f:
                         f.write(str(key) + '\t' + str(test_result) + '\n')
                 except FileNotFoundError:
                     self.utl.printout("Test failed: Results file not found")
-                except KeyError:
+                except (KeyError, IndexError):
                     self.utl.printout("Test failed: Result not found in file")
 
     @staticmethod
     def _purge_previous_results():
-        try:
-            os.remove(config.MATCH_SOURCE_CONFIG.RESULTS_FILE)
-        except OSError:
-            pass
+        for results_file in [config.MATCH_SOURCE_CONFIG.RESULTS_FILE,
+                             config.MATCH_SOURCE_CONFIG.RESULTS_FILE + FileMatchSource.RESULTS_INDEX_SUFFIX,
+                             config.MATCH_SOURCE_CONFIG.MATCHES_FILE + FileMatchSource.CURSOR_SUFFIX]:
+            try:
+                os.remove(results_file)
+            except OSError:
+                pass
+        config.MATCH_SOURCE_CONFIG.cursor_offset = None  # the matches file was rewritten
 
 
 def setup_bots():
@@ -1,17 +1,166 @@
-import datetime
+import asyncio
+import atexit
+import hashlib
 # import logging
+import queue
 import shutil
+import sys
+import threading
+import time
 
 from loguru import logger
 import math
 import os
-import signal
-import time
+import subprocess
+import uuid
 
 import psutil
+import requests
 from termcolor import colored
 
 
+class DownloadTooLargeException(Exception):
+    """
+    Download exceeds the configured size limit
+    """
+    pass
+
+
+class LogSink:
+    """
+    Writes the messages of Utl.printout in the background.
+
+    Messages are queued and a thread formats them and writes them to the console and to the log file, which stays
+    open. Both are flushed every flush_interval seconds instead of after every message. There is one sink per
+    log file, shared by every Utl that logs to it.
+    """
+
+    _sinks = {}  # log file -> LogSink
+    _sinks_lock = threading.Lock()
+    _STOP = object()
+    _MOVE = object()
+
+    def __init__(self, path, flush_interval):
+        self._path = path
+        self._flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._file = self._open()
+        self._thread = threading.Thread(target=self._run, name=f"log_{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def for_config(config):
+        """
+        The sink of LOG_FILE, created on first use.
+
+        :param config:
+        :return: LogSink
+        """
+        with LogSink._sinks_lock:
+            sink = LogSink._sinks.get(config.LOG_FILE)
+            if sink is None:
+                sink = LogSink(config.LOG_FILE, config.LOG_FLUSH_INTERVAL)
+                LogSink._sinks[config.LOG_FILE] = sink
+            return sink
+
+    def put(self, client_id, text):
+        """
+        Queue a message.
+
+        :param client_id:
+        :param text:
+        :return:
+        """
+        self._queue.put((time.time(), client_id, text))
+
+    def _open(self):
+        return open(self._path, "a+", buffering=64 * 1024)
+
+    def move(self, destination, timeout: float = 30):
+        """
+        Write the queued messages, move the log file to destination and continue in a new log file.
+        Blocks until the log file has been moved. If the sink thread doesn't get to it within timeout seconds, the
+        log file is moved directly.
+
+        :param destination:
+        :param timeout:
+        :return:
+        """
+        moved = threading.Event()
+        self._queue.put((LogSink._MOVE, destination, moved))
+        deadline = time.monotonic() + timeout
+        while not moved.wait(0.5):
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                sys.stderr.write(f"Log sink of {self._path} isn't running, moving the log file directly\n")
+                shutil.move(self._path, destination)
+                return
+
+    def close(self):
+        """
+        Write the queued messages and close the log file.
+
+        :return:
+        """
+        if self._thread.is_alive():
+            self._queue.put(LogSink._STOP)
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                message = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                message = None
+
+            if message is LogSink._STOP:
+                self._flush()
+                self._file.close()
+                return
+            # A failed write must not stop the sink, every later message would be lost
+            try:
+                if message is not None and message[0] is LogSink._MOVE:
+                    self._move(*message[1:])
+                elif message is not None:
+                    self._write(*message)
+            except Exception as e:
+                sys.stderr.write(f"Log sink of {self._path} failed to handle a message: {e!r}\n")
+
+            if time.monotonic() - last_flush >= self._flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+    def _move(self, destination, moved):
+        try:
+            self._file.close()
+            shutil.move(self._path, destination)
+        except OSError as e:
+            sys.stderr.write(f"Failed to move {self._path} to {destination}: {e}\n")
+        finally:
+            try:
+                self._file = self._open()
+            finally:
+                moved.set()
+
+    def _write(self, timestamp, client_id, text):
+        infos = [time.strftime("%b %d %H:%M:%S", time.localtime(timestamp)), client_id, str(text)]
+        # Maps yellow to the first info, red to the second, green for the text
+        colors = ["yellow", "red", "green"]
+        try:
+            sys.stdout.write(" ".join(colored(info, color) for info, color in zip(infos, colors)) + "\n")
+        finally:
+            # Still log to the file when the console can't take the message
+            self._file.write(" ".join(infos) + "\n")
+
+    def _flush(self):
+        for stream in (sys.stdout, self._file):
+            try:
+                stream.flush()
+            except Exception as e:
+                sys.stderr.write(f"Log sink of {self._path} failed to flush: {e!r}\n")
+
+
 class Utl:
     """
     Class containing helper functions for the AI Arena Client.
@@ -22,6 +171,7 @@ class Utl:
         self._config = config
 
         self._logger = logger
+        self._log_sink = LogSink.for_config(config)
 
     @staticmethod
     def is_valid_avg_step_time(num):
@@ -39,29 +189,64 @@ class Utl:
             return False
 
     # Print to console and log
-    def printout(self, text):
+    def printout(self, text, verbosity: int = 1):
         """
         Print to screen and log file using colors.
+        The message is written in the background by the LogSink of LOG_FILE.
 
         :param text:
+        :param verbosity: only print if LOG_VERBOSITY is at least this
         :return:
         """
-        now = datetime.datetime.now()
-        infos = [
-            now.strftime("%b %d %H:%M:%S"),
-            self._config.ARENA_CLIENT_ID,
-            str(text),
-        ]
-        # Maps yellow to the first info, red to the second, green for the text
-        colors = ["yellow", "red", "green"]
-        colored_infos = " ".join(
-            colored(info, color) for info, color in zip(infos, colors)
-        )
-        print(colored_infos)
-        with open(self._config.LOG_FILE, "a+") as f:
-            line = " ".join(infos) + "\n"
-            f.write(line)
+        if verbosity > self._config.LOG_VERBOSITY:
+            return
+        self._log_sink.put(self._config.ARENA_CLIENT_ID, str(text))
     
+    def move_log_file(self, destination):
+        """
+        Move LOG_FILE to destination. Logging continues in a new LOG_FILE.
+        destination always exists afterwards, even if the log couldn't be moved.
+
+        :param destination:
+        :return:
+        """
+        self._log_sink.move(destination)
+        if not os.path.exists(destination):
+            open(destination, "a").close()
+
+    @staticmethod
+    def copy_log_since(path, position, destination):
+        """
+        Copy what was written to a log file since position to destination, without touching the log file, which
+        may still be open for writing. A log rotated by a RotatingFileHandler since position is followed into
+        its first backup.
+
+        :param path:
+        :param position: returned by the previous call, None to copy the whole log
+        :param destination: always exists afterwards
+        :return: position to pass to the next call
+        """
+        inode, offset = position if position is not None else (None, 0)
+        with open(destination, "wb") as destination_file:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return position
+            if inode is not None and stat.st_ino != inode:
+                # Rotated, the part we haven't copied yet is at the end of the backup
+                try:
+                    if os.stat(f"{path}.1").st_ino == inode:
+                        with open(f"{path}.1", "rb") as backup:
+                            backup.seek(offset)
+                            shutil.copyfileobj(backup, destination_file)
+                except OSError:
+                    pass
+                offset = 0
+            with open(path, "rb") as log_file:
+                log_file.seek(min(offset, stat.st_size))
+                shutil.copyfileobj(log_file, destination_file)
+                return stat.st_ino, log_file.tell()
+
     @staticmethod
     def convert_wsl_paths(path):
         """
@@ -72,6 +257,79 @@ class Utl:
      
         return new_path
 
+    @staticmethod
+    def atomic_write(path, content: bytes):
+        """
+        Write content to path through a temporary file in the same directory, so readers only ever see the old
+        or the new file.
+
+        :param path:
+        :param content:
+        :return:
+        """
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def unshare_file(path):
+        """
+        Replace a hard linked file by a copy of it, so changing its contents or permissions doesn't change the other
+        links, like the bot cache.
+
+        :param path:
+        :return:
+        """
+        if os.lstat(path).st_nlink <= 1:
+            return
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copy2(path, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def stream_download(url, path, headers=None, max_size=None, chunk_size=1024 * 1024, session=None):
+        """
+        Download url to path in chunks while calculating the MD5 hash, so the file is never held in memory or
+        read back from disk.
+
+        :param url:
+        :param path:
+        :param headers:
+        :param max_size: abort the download once more than this many bytes are received
+        :param chunk_size:
+        :param session: requests session to download with
+        :return: the MD5 hex digest of the downloaded file
+        """
+        md5 = hashlib.md5()
+        size = 0
+        try:
+            with (session or requests).get(url, headers=headers, stream=True) as r:
+                r.raise_for_status()
+                content_length = r.headers.get("Content-Length")
+                if max_size is not None and content_length is not None and int(content_length) > max_size:
+                    raise DownloadTooLargeException(f"{url} is {content_length} bytes, the limit is {max_size}")
+                with open(path, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        size += len(chunk)
+                        if max_size is not None and size > max_size:
+                            raise DownloadTooLargeException(f"{url} is larger than the limit of {max_size} bytes")
+                        md5.update(chunk)
+                        f.write(chunk)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return md5.hexdigest()
+
     # Needed for hashlib md5 function
     @staticmethod
     def file_as_bytes(file):
@@ -106,7 +364,7 @@ class Utl:
         :param pid:
         :return:
         """
-        return pid in (p.pid for p in psutil.process_iter())
+        return psutil.pid_exists(pid)
 
     @staticmethod
     def check_pid(pid: int):
@@ -123,22 +381,8 @@ class Utl:
         else:
             return True
 
-    def pid_cleanup(self, pids):
-        """
-        Kills all the pids passed as a list to this function
-
-        :param pids:
-        :return:
-        """
-        for pid in pids:
-            self._logger.debug("Killing: " + str(pid))
-            try:
-                os.kill(pid, signal.SIGTERM)
-            except Exception:
-                self._logger.debug("Already closed: " + str(pid))
-
     @staticmethod
-    def move_pids(pids):
+    async def move_pids(pids):
         """
         Move the pid/pids to another process group to avoid the bot killing the aiarena client when closing.
         (CPP API specific)
@@ -159,47 +403,41 @@ class Utl:
                     except OSError:
                         if os.getpgid(pid) == 0:
                             return
-                        time.sleep(0.25)  # sleep for retry
+                        await asyncio.sleep(0.25)  # sleep for retry
 
-    def kill_current_server(self):
+    def set_secure_mode_permissions(self, uid, gid, directory):
         """
-        Kills all the processes running on the match runner's port. Also kills any SC2 processes if they are
-        still running.
+        Give uid and gid ownership of directory and everything in it, with mode 770.
+
+        chown -R and chmod -R walk the tree in C, which is a lot faster than a walk in Python for bots with many
+        files. The Python walk is only used if those commands aren't available.
 
+        Symbolic links, to files or directories, are chowned themselves and never followed, so nothing outside of
+        directory is handed to the bot user. Both the commands and the Python walk work that way.
+
+        :param uid:
+        :param gid:
+        :param directory:
         :return:
         """
-        # return None
-        try:
-            if self._config.SYSTEM == "Linux":
-                self.printout("Killing SC2")
-                os.system("pkill -f SC2_x64")
-                os.system(f"lsof -ti tcp:{self._config.PORT} | xargs kill")
-            for process in psutil.process_iter():
-                for conns in process.connections(kind="inet"):
-                    if conns.laddr.port == self._config.SC2_PROXY["PORT"]:
-                        process.send_signal(signal.SIGTERM)
-                if process.name() == "SC2_x64.exe":
-                    process.send_signal(signal.SIGTERM)
-        except:
-            pass
+        self.printout(f"CHOWNing {directory} to uid {uid} gid {gid}")
+        chown = shutil.which("chown")
+        chmod = shutil.which("chmod")
+        if chown is not None and chmod is not None:
+            # -h changes symbolic links instead of the files they point to
+            subprocess.run([chown, "-R", "-h", f"{uid}:{gid}", directory], check=True)
+            subprocess.run([chmod, "-R", "770", directory], check=True)
+            return
 
-    def set_secure_mode_permissions(self, uid, gid, directory):
-        self.printout(f"CHOWNing the following paths to uid {uid} gid {gid}")
-        for root, dirs, files in os.walk(directory):
-            path = root
-            self.printout(path)
-            os.chmod(path, mode=0o770)
-            os.chown(path, uid=uid, gid=gid)
-            for d in dirs:
-                path = os.path.join(root, d)
-                self.printout(path)
-                os.chmod(path, mode=0o770)
-                os.chown(path, uid=uid, gid=gid)
-            for f in files:
-                path = os.path.join(root, f)
-                self.printout(path)
-                os.chmod(path, mode=0o770)
-                os.chown(path, uid=uid, gid=gid)
+        for root, dirs, files in os.walk(directory, followlinks=False):
+            # Every directory is the root of one step of the walk. Links to directories aren't walked into, they are
+            # listed in dirs instead, so handle them here like links to files.
+            links = [os.path.join(root, name) for name in dirs if os.path.islink(os.path.join(root, name))]
+            for path in [root] + [os.path.join(root, name) for name in files] + links:
+                self.printout(path, verbosity=2)
+                if not os.path.islink(path):
+                    os.chmod(path, mode=0o770)
+                os.chown(path, uid=uid, gid=gid, follow_symlinks=False)
 
     def clean_dir(self, directory):
         for filename in os.listdir(directory):
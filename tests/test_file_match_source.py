@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from arenaclient.match.matches import FileMatchSource
+
+
+class FileMatchSourceTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self._directory.cleanup)
+        self.matches_file = os.path.join(self._directory.name, "matches")
+        self.results_file = os.path.join(self._directory.name, "results.json")
+        self.config = SimpleNamespace(
+            BOTS_DIRECTORY=os.path.join(self._directory.name, "bots"),
+            BOT_LOGS_DIRECTORY=os.path.join(self._directory.name, "logs"),
+            TEMP_PATH=self._directory.name,
+            LOG_FILE=os.path.join(self._directory.name, "client.log"),
+            LOG_FLUSH_INTERVAL=1,
+            EXTRACT_THREADS=4,
+            MAX_EXTRACTED_SIZE=16 * 1024 ** 3,
+            MAX_EXTRACTED_MEMBERS=200000,
+        )
+
+    def _write_matches(self, *lines, mode="w"):
+        with open(self.matches_file, mode) as f:
+            f.writelines(line + "\n" for line in lines)
+
+    def _source(self) -> FileMatchSource:
+        """A new source with its own config, like a restarted client."""
+        return FileMatchSource(self.config,
+                               FileMatchSource.FileMatchSourceConfig(self.matches_file, self.results_file))
+
+    @staticmethod
+    def _next_map(source: FileMatchSource):
+        match = asyncio.run(source.next_match())
+        return None if match is None else match.map_name
+
+    @staticmethod
+    def _play(source: FileMatchSource, result: str = "Player1Win"):
+        """Take the next match and submit a result for it, returns the match ID."""
+        match = asyncio.run(source.next_match())
+        asyncio.run(source.submit_result(match, SimpleNamespace(
+            to_json=lambda: {"MatchID": match.id, "Map": match.map_name, "Result": result})))
+        return match.id
+
+    def _write_results(self, content: str):
+        with open(self.results_file, "w") as f:
+            f.write(content)
+
+    def _read_result_lines(self) -> list:
+        with open(self.results_file, "r") as f:
+            return f.read().splitlines()
+
+    def test_plays_every_line_once(self):
+        self._write_matches("# header", "a,T,python,b,Z,python,Map1", "", "a,T,python,b,Z,python,Map2")
+        source = self._source()
+        self.assertTrue(source.has_next())
+        self.assertEqual("Map1", self._next_map(source))
+        self.assertEqual("Map2", self._next_map(source))
+        self.assertFalse(source.has_next())
+        self.assertIsNone(self._next_map(source))
+
+        self._write_matches("a,T,python,b,Z,python,Map3", mode="a")
+        self.assertTrue(source.has_next())
+        self.assertEqual("Map3", self._next_map(source))
+
+    def test_restart_continues_after_last_line(self):
+        self._write_matches("a,T,python,b,Z,python,Map1", "a,T,python,b,Z,python,Map2")
+        self.assertEqual("Map1", self._next_map(self._source()))
+
+        restarted = self._source()
+        self.assertEqual("Map2", self._next_map(restarted))
+        self.assertFalse(restarted.has_next())
+
+    def test_replaced_matches_file_starts_from_top(self):
+        self._write_matches("a,T,python,b,Z,python,Map1", "a,T,python,b,Z,python,Map2")
+        self.assertEqual("Map1", self._next_map(self._source()))
+
+        # The cursor offset still points inside the file, but not after the line that was played
+        self._write_matches("c,P,python,d,R,python,Other1", "c,P,python,d,R,python,Other2")
+        self.assertEqual("Other1", self._next_map(self._source()))
+
+    def test_corrupt_cursor_starts_from_top(self):
+        self._write_matches("a,T,python,b,Z,python,Map1")
+        with open(self.matches_file + FileMatchSource.CURSOR_SUFFIX, "w") as f:
+            f.write("{not json")
+        self.assertEqual("Map1", self._next_map(self._source()))
+
+
+    def test_results_are_appended_as_json_lines(self):
+        self._write_matches(*["a,T,python,b,Z,python,Map1"] * 3)
+        source = self._source()
+        self.assertEqual([1, 2], [self._play(source), self._play(source)])
+        self.assertEqual([1, 2], [json.loads(line)["MatchID"] for line in self._read_result_lines()])
+
+        # A restarted client carries on with the match IDs
+        self.assertEqual(3, self._play(self._source()))
+        self.assertEqual([1, 2, 3], [r["MatchID"] for r in FileMatchSource.load_results(self.results_file)])
+
+    def test_results_index(self):
+        self._write_matches(*["a,T,python,b,Z,python,Map1"] * 2)
+        self._play(self._source())
+        with open(self.results_file + FileMatchSource.RESULTS_INDEX_SUFFIX, "r") as f:
+            index = json.load(f)
+        self.assertEqual({"last_match_id": 1, "size": os.path.getsize(self.results_file)}, index)
+
+        # The index is trusted as long as the size of the results file matches
+        with open(self.results_file + FileMatchSource.RESULTS_INDEX_SUFFIX, "w") as f:
+            json.dump(dict(index, last_match_id=41), f)
+        self.assertEqual(41, self._source().get_next_match_id())
+
+        # and ignored once the results file changed behind its back
+        with open(self.results_file, "a") as f:
+            f.write(json.dumps({"MatchID": 7}) + "\n")
+        self.assertEqual(7, self._source().get_next_match_id())
+
+    def test_partly_written_result(self):
+        self._write_matches("a,T,python,b,Z,python,Map1")
+        self._write_results(json.dumps({"MatchID": 5}) + "\n" + '{"MatchID": 6, "Res')
+        source = self._source()
+        self.assertEqual(5, source.get_next_match_id())
+
+        self.assertEqual(6, self._play(source))
+        lines = self._read_result_lines()
+        self.assertEqual('{"MatchID": 6, "Res', lines[1])
+        self.assertEqual(6, json.loads(lines[2])["MatchID"])
+        self.assertEqual([5, 6], [r["MatchID"] for r in FileMatchSource.load_results(self.results_file)])
+
+    def test_legacy_results_file_is_converted(self):
+        self._write_matches("a,T,python,b,Z,python,Map1")
+        self._write_results(json.dumps({"Results": [{"MatchID": 3}, {"MatchID": 4}]}))
+        self.assertEqual([3, 4], [r["MatchID"] for r in FileMatchSource.load_results(self.results_file)])
+
+        self.assertEqual(5, self._play(self._source()))
+        self.assertEqual([3, 4, 5], [json.loads(line)["MatchID"] for line in self._read_result_lines()])
+
+    def test_export_results(self):
+        self._write_results(json.dumps({"MatchID": 1}) + "\n" + json.dumps({"MatchID": 2}) + "\n")
+        export_file = os.path.join(self._directory.name, "export.json")
+        FileMatchSource.export_results(self.results_file, export_file)
+        with open(export_file, "r") as f:
+            self.assertEqual({"Results": [{"MatchID": 1}, {"MatchID": 2}]}, json.load(f))
+
+
+if __name__ == "__main__":
+    unittest.main()
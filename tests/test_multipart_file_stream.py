@@ -0,0 +1,70 @@
+import email.parser
+import email.policy
+import os
+import tempfile
+import unittest
+
+from arenaclient.match.http_session import MultipartFileStream
+
+
+class MultipartFileStreamTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self._directory.cleanup)
+        self.large_file = self._write("replay.SC2Replay", os.urandom(200 * 1024))
+        self.empty_file = self._write("empty.log", b"")
+
+    def _write(self, name: str, content: bytes) -> str:
+        path = os.path.join(self._directory.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    @staticmethod
+    def _parse(stream: MultipartFileStream, body: bytes) -> dict:
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {stream.content_type}\r\n\r\n".encode("utf-8") + body)
+        parts = {}
+        for part in message.iter_parts():
+            parts.setdefault(part.get_param("name", header="content-disposition"), []).append(
+                (part.get_filename(), part.get_payload(decode=True)))
+        return parts
+
+    def test_body(self):
+        with MultipartFileStream({"match": 12, "type": "Player1Win", "bot1_avg_step_time": None,
+                                  "tags": ["a", "b"]},
+                                 {"replay_file": self.large_file, "arenaclient_log": self.empty_file}) as stream:
+            body = stream.read()
+            self.assertEqual(len(stream), len(body))
+            self.assertEqual(b"", stream.read())
+
+        parts = self._parse(stream, body)
+        self.assertEqual([(None, b"12")], parts["match"])
+        self.assertEqual([(None, b"Player1Win")], parts["type"])
+        self.assertEqual([(None, b"a"), (None, b"b")], parts["tags"])
+        self.assertNotIn("bot1_avg_step_time", parts)
+        with open(self.large_file, "rb") as f:
+            self.assertEqual([("replay.SC2Replay", f.read())], parts["replay_file"])
+        self.assertEqual([("empty.log", b"")], parts["arenaclient_log"])
+
+    def test_chunked_read_and_rewind(self):
+        with MultipartFileStream({"match": 1}, {"replay_file": self.large_file}) as stream:
+            first = b"".join(stream)
+            self.assertEqual(len(stream), stream.tell())
+
+            stream.seek(0)
+            self.assertEqual(0, stream.tell())
+            second = b"".join(iter(lambda: stream.read(1000), b""))
+            self.assertEqual(first, second)
+
+            stream.seek(0)
+            stream.read(100 * 1024)  # stop in the middle of the file, like an aborted upload
+            stream.seek(0)
+            self.assertEqual(first, stream.read())
+
+            with self.assertRaises(OSError):
+                stream.seek(10)
+
+
+if __name__ == "__main__":
+    unittest.main()